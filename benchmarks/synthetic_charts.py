@@ -0,0 +1,118 @@
+# Generates synthetic medical charts (page markdown plus the extraction a perfect LLM would return for any chunk of it)
+
+import random
+import re
+
+# Records per chart for each size preset
+CHART_SIZES = {
+    "small":  {"visits": 2,  "diagnoses_per_visit": 1, "medications_per_visit": 1, "labs_per_visit": 3,  "providers": 2,  "visits_per_page": 2},
+    "medium": {"visits": 10, "diagnoses_per_visit": 2, "medications_per_visit": 2, "labs_per_visit": 8,  "providers": 5,  "visits_per_page": 2},
+    "large":  {"visits": 40, "diagnoses_per_visit": 3, "medications_per_visit": 3, "labs_per_visit": 15, "providers": 12, "visits_per_page": 2}
+}
+
+LAST_NAMES = ["Smith", "Patel", "Nguyen", "Garcia", "Okafor", "Kim", "Müller", "Rossi", "Cohen", "Silva", "Haddad", "Novak"]
+SPECIALTIES = ["Cardiology", "Internal Medicine", "Endocrinology", "Family Medicine", "Nephrology", "Pulmonology"]
+VISIT_TYPES = ["office visit", "follow-up", "telehealth", "urgent care", "annual physical"]
+DIAGNOSES = [("Essential hypertension", "I10"), ("Type 2 diabetes mellitus", "E11.9"), ("Hyperlipidemia", "E78.5"),
+             ("Chronic kidney disease stage 3", "N18.3"), ("Asthma, mild persistent", "J45.30"), ("Hypothyroidism", "E03.9")]
+MEDICATIONS = [("Lisinopril", "10", "mg", "daily"), ("Metformin", "500", "mg", "twice daily"), ("Atorvastatin", "20", "mg", "nightly"),
+               ("Levothyroxine", "75", "mcg", "daily"), ("Albuterol", "90", "mcg", "as needed")]
+LABS = [("Hemoglobin A1c", "%", 4.0, 5.6), ("Glucose", "mg/dL", 70, 99), ("Creatinine", "mg/dL", 0.6, 1.3),
+        ("LDL cholesterol", "mg/dL", 0, 99), ("TSH", "mIU/L", 0.4, 4.0), ("Sodium", "mmol/L", 135, 145), ("Potassium", "mmol/L", 3.5, 5.1)]
+
+# Marks every generated record in the markdown so the fake LLM can tell which records a chunk contains
+REF_PATTERN = re.compile(r"\[ref:(\d+):(\d+)\]")
+
+def provider_pool(size: int = 50) -> list[dict]:
+    """Providers shared by every chart, so provider/department resolution sees repeats across documents"""
+    return [{
+        "provider_name": f"Dr. {LAST_NAMES[idx % len(LAST_NAMES)]} {chr(65 + idx // len(LAST_NAMES))}.",
+        "npi_number": str(1000000000 + idx * 7919),
+        "specialty": SPECIALTIES[idx % len(SPECIALTIES)]
+    } for idx in range(size)]
+
+def generate_chart(chart_id: int, size: str = "small", seed: int = 0, providers: list[dict] = None) -> dict:
+    """
+    Returns {"patient_id", "pdf_path", "size", "pages": [markdown, ...], "records": {ref: record}}, where each
+    record is {"section", "data", "visit"} and "visit" is the ref of the visit the record belongs to.
+    """
+    spec = CHART_SIZES[size]
+    rng = random.Random(f"{seed}:{chart_id}")
+    providers = providers or provider_pool()
+    chart_providers = rng.sample(providers, min(spec["providers"], len(providers)))
+    patient_id = 100000 + chart_id
+
+    records = {}
+    def add(section, data, visit_ref=None):
+        ref = f"[ref:{chart_id}:{len(records)}]"
+        records[ref] = {"section": section, "data": data, "visit": visit_ref}
+        return ref
+
+    pages, lines = [], [f"# Medical Record\nPatient ID: {patient_id}  MRN: MRN{patient_id:07d}\n"]
+    for visit_number in range(1, spec["visits"] + 1):
+        provider = rng.choice(chart_providers)
+        visit_date = f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        visit = {
+            "visit_id": visit_number,
+            "visit_date": visit_date,
+            "visit_type": rng.choice(VISIT_TYPES),
+            "primary_provider": dict(provider),
+            "department": {"department_name": f"{provider['specialty']} Clinic", "department_type": "outpatient", "system_name": "General Hospital"}
+        }
+        visit_ref = add("visit", visit)
+        lines.append(f"## Visit {visit_date} - {visit['visit_type']} {visit_ref}")
+        lines.append(f"Provider: {provider['provider_name']} (NPI {provider['npi_number']}), {provider['specialty']}, {visit['department']['department_name']}")
+        lines.append("Chief complaint: routine follow-up of chronic conditions. Patient reports feeling well, denies chest pain or shortness of breath.")
+
+        for name, code in rng.sample(DIAGNOSES, spec["diagnoses_per_visit"]):
+            ref = add("diagnosis", {"visit_id": visit_number, "diagnosis_name": name, "icd10_code": code, "is_chronic": True}, visit_ref)
+            lines.append(f"Diagnosis: {name} (ICD-10 {code}) {ref}")
+
+        for name, dose, unit, frequency in rng.sample(MEDICATIONS, spec["medications_per_visit"]):
+            ref = add("medication", {"visit_id": visit_number, "medication_name": name, "dose": dose, "dose_unit": unit,
+                                     "frequency": frequency, "start_date": visit_date, "prescribing_provider": dict(provider)}, visit_ref)
+            lines.append(f"Medication: {name} {dose} {unit} {frequency} {ref}")
+
+        for _ in range(spec["labs_per_visit"]):
+            name, unit, low, high = rng.choice(LABS)
+            value = round(rng.uniform(low * 0.8, high * 1.3), 1)
+            ref = add("labresult", {"visit_id": visit_number, "lab_name": "Quest Diagnostics", "test_name": name,
+                                    "result_value": str(value), "result_numeric": value, "unit_of_measurement": unit,
+                                    "reference_range_low": low, "reference_range_high": high,
+                                    "abnormality_flag": not low <= value <= high, "collection_datetime": visit_date,
+                                    "ordering_provider": dict(provider)}, visit_ref)
+            lines.append(f"Lab: {name} {value} {unit} (ref {low}-{high}) collected {visit_date} {ref}")
+        lines.append("")
+
+        if visit_number % spec["visits_per_page"] == 0 or visit_number == spec["visits"]:
+            pages.append("\n".join(lines))
+            lines = []
+
+    return {"patient_id": patient_id, "pdf_path": f"synthetic/{size}/chart_{chart_id}.pdf", "size": size,
+            "pages": pages, "records": records}
+
+class ChartResponder:
+    def __init__(self, charts: list[dict]):
+        """Callable for tools.fake_llm.FakeLLM(response=...): answers with exactly the records referenced in the prompt"""
+        self.records = {}
+        for chart in charts:
+            for ref, record in chart["records"].items():
+                self.records[ref] = (chart["patient_id"], record)
+
+    def __call__(self, prompt: str) -> dict:
+        response = {"patient": {}, "visit": []}
+        visits, seen = {}, set()
+        for match in REF_PATTERN.finditer(prompt):
+            if match.group(0) in seen or match.group(0) not in self.records:
+                continue
+            seen.add(match.group(0))
+            patient_id, record = self.records[match.group(0)]
+            response["patient"] = {"patient_id": patient_id, "medical_record_number": f"MRN{patient_id:07d}"}
+
+            visit_ref = match.group(0) if record["section"] == "visit" else record["visit"]
+            if visit_ref not in visits:
+                visits[visit_ref] = dict(self.records[visit_ref][1]["data"], patient_id=patient_id)
+                response["visit"].append(visits[visit_ref])
+            if record["section"] != "visit":
+                response.setdefault(record["section"], []).append(dict(record["data"], patient_id=patient_id))
+        return response
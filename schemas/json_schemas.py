@@ -182,3 +182,17 @@ class ProcedureTreatment(BaseModel):
     sessions_completed:     Optional[int]           = Field(None, ge=0)
     sessions_planned:       Optional[int]           = Field(None, ge=0)
     created_date:           datetime                = Field(default_factory=datetime.now)
+
+# Sections requested from the LLM and whether each one is a list of records
+EXTRACTION_SCHEMAS = {
+    Patient: False,
+    Visit: True,
+    VisitNotes: True,
+    Diagnosis: True,
+    Symptom: True,
+    Medication: True,
+    VitalSigns: True,
+    LabResult: True,
+    ImagingStudy: True,
+    ProcedureTreatment: True
+}
@@ -1,13 +1,29 @@
 # Reference Relational Database Schema Here: https://dbdiagram.io/d/Database-Schema-Smart-EMR-685e4192f413ba350825a2dc
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Text
+    Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Text, Index, UniqueConstraint
 )
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, declared_attr
 from datetime import datetime
 
 Base = declarative_base()
 
+class IngestedRecordMixin:
+    """
+    Provenance for incremental re-ingestion: the source document, a hash of the record's natural key
+    (unique per document, the upsert target) and a hash of its content (to detect changed rows)
+    """
+    natural_key = Column(String(64), nullable=True)
+    row_hash = Column(String(64), nullable=True)
+
+    @declared_attr
+    def document_id(cls):
+        return Column(Integer, ForeignKey("documents.id"), nullable=True)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (Index(f"uq_{cls.__tablename__}_document_natural_key", "document_id", "natural_key", unique=True),)
+
 class Patient(Base):
     __tablename__ = "patients"
     id = Column(Integer, primary_key=True)
@@ -33,7 +49,7 @@ class Department(Base):
     system_name = Column(String(100), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class Visit(Base):
+class Visit(IngestedRecordMixin, Base):
     __tablename__ = "visits"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -44,7 +60,7 @@ class Visit(Base):
     discharge_date = Column(DateTime, nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class VisitNotes(Base):
+class VisitNotes(IngestedRecordMixin, Base):
     __tablename__ = "visit_notes"
     id = Column(Integer, primary_key=True)
     visit_id = Column(Integer, ForeignKey("visits.id"), nullable=True)
@@ -64,7 +80,7 @@ class VisitNotes(Base):
     extraction_timestamp = Column(String(50), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class Diagnosis(Base):
+class Diagnosis(IngestedRecordMixin, Base):
     __tablename__ = "diagnoses"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -83,7 +99,7 @@ class Diagnosis(Base):
     updated_date = Column(String(20), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class Symptom(Base):
+class Symptom(IngestedRecordMixin, Base):
     __tablename__ = "symptoms"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -100,7 +116,7 @@ class Symptom(Base):
     resolution_date = Column(String(20), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class Medication(Base):
+class Medication(IngestedRecordMixin, Base):
     __tablename__ = "medications"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -123,7 +139,7 @@ class Medication(Base):
     updated_date = Column(String(20), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class VitalSigns(Base):
+class VitalSigns(IngestedRecordMixin, Base):
     __tablename__ = "vital_signs"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -144,7 +160,7 @@ class VitalSigns(Base):
     measured_by_id = Column(Integer, ForeignKey("providers.id"), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class LabResult(Base):
+class LabResult(IngestedRecordMixin, Base):
     __tablename__ = "lab_results"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -167,7 +183,7 @@ class LabResult(Base):
     clinical_significance = Column(String(100), nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class ImagingStudy(Base):
+class ImagingStudy(IngestedRecordMixin, Base):
     __tablename__ = "imaging_studies"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -188,7 +204,7 @@ class ImagingStudy(Base):
     critical_findings = Column(Boolean, default=False)
     created_date = Column(DateTime, default=datetime.utcnow)
 
-class ProcedureTreatment(Base):
+class ProcedureTreatment(IngestedRecordMixin, Base):
     __tablename__ = "procedure_treatments"
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -206,3 +222,20 @@ class ProcedureTreatment(Base):
     sessions_completed = Column(Integer, nullable=True)
     sessions_planned = Column(Integer, nullable=True)
     created_date = Column(DateTime, default=datetime.utcnow)
+
+class Document(Base):
+    __tablename__ = "documents"
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, nullable=False)
+    source_key = Column(String(255), nullable=False)
+    file_hash = Column(String(64), nullable=False)
+    extraction_version = Column(String(64), nullable=False)
+    created_date = Column(DateTime, default=datetime.utcnow)
+    updated_date = Column(DateTime, nullable=True)
+    __table_args__ = (UniqueConstraint("patient_id", "source_key", name="uq_documents_patient_source"),)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    applied_date = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,67 @@
+from langchain_core.documents import Document
+from tools.chunk_router import ChunkRouter
+
+BANNER = "Valley Clinic - Patient: Jane Roe DOB 01/02/1960"
+
+def visit_page(number: int, date: str) -> str:
+    return "\n".join([
+        BANNER,
+        f"Page {number} of 4",
+        f"Visit {date} follow-up with Dr. Smith",
+        "Vitals: BP 120/80 mmHg, HR 72",
+        "Medication: Metformin 500 mg PO BID",
+        "Fax: (555) 010-0000",
+        "Valley Clinic Records Department"
+    ])
+
+def chart_chunks() -> list:
+    dates = ["2024-01-05", "2024-02-05", "2024-03-05", "2024-04-05"]
+    return [Document(page_content=visit_page(number, date)) for number, date in enumerate(dates, start=1)]
+
+def test_repeated_clinical_lines_are_kept_in_every_visit():
+    routed = ChunkRouter().route(chart_chunks())
+
+    assert len(routed) == 4
+    for doc in routed:
+        assert "Vitals: BP 120/80 mmHg, HR 72" in doc.page_content
+        assert "Medication: Metformin 500 mg PO BID" in doc.page_content
+        assert "medication" in doc.metadata["sections"]
+        assert "vitalsigns" in doc.metadata["sections"]
+
+def test_running_headers_and_footers_are_kept_once():
+    routed = ChunkRouter().route(chart_chunks())
+
+    assert BANNER in routed[0].page_content
+    assert "Valley Clinic Records Department" in routed[0].page_content
+    for doc in routed[1:]:
+        assert BANNER not in doc.page_content
+        assert "Valley Clinic Records Department" not in doc.page_content
+        assert "Page" not in doc.page_content
+
+def test_header_stripping_alone_never_empties_a_chunk():
+    header_only = "\n".join([BANNER, "Valley Clinic Records Department"])
+    docs = [Document(page_content=header_only + "\nPatient portal enrollment letter, no action required by you.")
+            for _ in range(3)]
+
+    routed = ChunkRouter().route(docs)
+
+    assert len(routed) == 3
+    assert all(BANNER in doc.page_content for doc in routed)
+
+def test_repeated_lines_inside_a_split_chart():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text = "\n\n<!-- PAGE BREAK -->\n\n".join(doc.page_content for doc in chart_chunks())
+    docs = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=0).create_documents([text])
+
+    routed = ChunkRouter().route(docs)
+
+    assert sum(doc.page_content.count("Metformin 500 mg") for doc in routed) == 4
+
+def test_headers_are_counted_across_calls_with_shared_state():
+    router, state = ChunkRouter(), {}
+
+    routed = [router.route([doc], state) for doc in chart_chunks()]
+
+    assert [BANNER in docs[0].page_content for docs in routed] == [True, True, False, False]
+    assert all("Metformin 500 mg" in docs[0].page_content for docs in routed)
@@ -0,0 +1,50 @@
+import copy
+
+from sqlalchemy import Column, MetaData, Table, create_engine, inspect
+
+from schemas.sql_schema import Base
+from utils.database import get_engine, get_sessionmaker
+from utils.document_registry import DocumentRegistry
+from utils.unit_of_work import UnitOfWork
+
+PROVENANCE_COLUMNS = ("document_id", "natural_key", "row_hash")
+
+def create_baseline_schema(url: str) -> None:
+    """Tables as the original code created them: no documents/schema_version tables and no provenance columns"""
+    baseline = MetaData()
+    for table in Base.metadata.sorted_tables:
+        if table.name in ("documents", "schema_version"):
+            continue
+        Table(table.name, baseline, *[Column(column.name, column.type, primary_key=column.primary_key)
+                                      for column in table.columns if column.name not in PROVENANCE_COLUMNS])
+    engine = create_engine(url)
+    baseline.create_all(engine)
+    engine.dispose()
+
+def test_baseline_database_gets_provenance_columns(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    create_baseline_schema(url)
+
+    engine = get_engine({"url": url})
+
+    inspector = inspect(engine)
+    assert {"documents", "schema_version"} <= set(inspector.get_table_names())
+    for table in ("visits", "diagnoses", "medications"):
+        assert set(PROVENANCE_COLUMNS) <= {column["name"] for column in inspector.get_columns(table)}
+
+def test_registered_document_persists_on_a_baseline_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    create_baseline_schema(url)
+    engine = get_engine({"url": url})
+    pdf = tmp_path / "chart.pdf"
+    pdf.write_text("v1")
+
+    data = {
+        "patient": {"patient_id": 7},
+        "visit": [{"visit_id": 1, "visit_date": "2024-01-02", "visit_type": "office"}],
+        "diagnosis": [{"visit_id": 1, "diagnosis_name": "hypertension"}],
+        "document": DocumentRegistry("v1").describe(7, str(pdf))
+    }
+    UnitOfWork({"bulk_resolve": True}).persist(get_sessionmaker(engine), copy.deepcopy(data))
+
+    assert DocumentRegistry("v1").is_unchanged(get_sessionmaker(engine), data["document"])
@@ -0,0 +1,86 @@
+import copy
+
+from sqlalchemy import select
+
+from schemas.sql_schema import Diagnosis, Document, Visit
+from utils.database import get_engine, get_sessionmaker
+from utils.document_registry import DocumentRegistry, source_key
+from utils.unit_of_work import UnitOfWork
+
+EXTRACTION = {
+    "patient": {"patient_id": 7},
+    "visit": [{"visit_id": 1, "visit_date": "2024-01-02", "visit_type": "office"},
+              {"visit_id": 2, "visit_date": "2024-02-02", "visit_type": "follow-up"}],
+    "diagnosis": [{"visit_id": 1, "diagnosis_name": "hypertension"}, {"visit_id": 2, "diagnosis_name": "asthma"}]
+}
+
+def ingest(engine, pdf_path, extraction, source_id=None) -> bool:
+    """process_document's registry steps without scraping or the LLM; False when the document was skipped"""
+    registry = DocumentRegistry("v1")
+    document = registry.describe(7, str(pdf_path), source_id)
+    if registry.is_unchanged(get_sessionmaker(engine), document):
+        return False
+    UnitOfWork({"bulk_resolve": True}).persist(get_sessionmaker(engine), dict(copy.deepcopy(extraction), document=document))
+    return True
+
+def rows(engine, *columns):
+    with engine.connect() as conn:
+        return conn.execute(select(*columns).order_by(*columns)).all()
+
+def make_engine(tmp_path):
+    return get_engine({"url": f"sqlite:///{tmp_path / 'registry.db'}"})
+
+def test_unchanged_document_is_skipped(tmp_path):
+    engine = make_engine(tmp_path)
+    pdf = tmp_path / "chart.pdf"
+    pdf.write_text("v1")
+
+    assert ingest(engine, pdf, EXTRACTION)
+    assert not ingest(engine, pdf, EXTRACTION)
+    assert len(rows(engine, Visit.id)) == 2
+
+def test_changed_document_writes_delta_and_deletes_missing_rows(tmp_path):
+    engine = make_engine(tmp_path)
+    pdf = tmp_path / "chart.pdf"
+    pdf.write_text("v1")
+    ingest(engine, pdf, EXTRACTION)
+    (first_visit_id,) = rows(engine, Visit.id)[0]
+
+    pdf.write_text("v2")
+    changed = copy.deepcopy(EXTRACTION)
+    changed["visit"] = changed["visit"][:1]
+    changed["diagnosis"] = [{"visit_id": 1, "diagnosis_name": "hypertension", "is_chronic": True}]
+    assert ingest(engine, pdf, changed)
+
+    assert rows(engine, Visit.id, Visit.visit_type) == [(first_visit_id, "office")]
+    assert rows(engine, Diagnosis.visit_id, Diagnosis.diagnosis_name, Diagnosis.is_chronic) == [(first_visit_id, "hypertension", True)]
+
+def test_same_file_name_in_different_folders_are_separate_documents(tmp_path):
+    engine = make_engine(tmp_path)
+    charts = [tmp_path / "a" / "chart.pdf", tmp_path / "b" / "chart.pdf"]
+    for folder, pdf in zip("ab", charts):
+        pdf.parent.mkdir()
+        pdf.write_text(folder)
+
+    other = copy.deepcopy(EXTRACTION)
+    other["visit"] = [{"visit_id": 1, "visit_date": "2024-03-03", "visit_type": "office"}]
+    other["diagnosis"] = [{"visit_id": 1, "diagnosis_name": "gout"}]
+    assert ingest(engine, charts[0], EXTRACTION)
+    assert ingest(engine, charts[1], other)
+    # A re-run finds both documents unchanged instead of flipping one shared row back and forth
+    assert not ingest(engine, charts[0], EXTRACTION)
+    assert not ingest(engine, charts[1], other)
+
+    assert len(rows(engine, Document.id)) == 2
+    assert rows(engine, Diagnosis.diagnosis_name) == [("asthma",), ("gout",), ("hypertension",)]
+
+def test_source_id_overrides_the_path(tmp_path):
+    engine = make_engine(tmp_path)
+    old, moved = tmp_path / "inbox" / "chart.pdf", tmp_path / "archive" / "chart-2024.pdf"
+    for pdf in (old, moved):
+        pdf.parent.mkdir()
+        pdf.write_text("v1")
+
+    assert ingest(engine, old, EXTRACTION, source_id="mrn-7/chart")
+    assert not ingest(engine, moved, EXTRACTION, source_id="mrn-7/chart")
+    assert source_key(str(old)) != source_key(str(moved))
@@ -0,0 +1,45 @@
+from utils.json_merger import JSONMerger
+
+METFORMIN = {"medication_name": "Metformin", "dose": "500", "dose_unit": "mg", "frequency": "BID", "start_date": None}
+
+def visit(visit_id: int, date: str) -> dict:
+    return {"visit_id": visit_id, "visit_date": date, "visit_type": "office"}
+
+def test_same_record_at_two_visits_is_kept_per_visit():
+    partial = {
+        "visit": [visit(1, "2024-01-05"), visit(2, "2024-02-05")],
+        "medication": [dict(METFORMIN, visit_id=1), dict(METFORMIN, visit_id=2)],
+        "diagnosis": [{"diagnosis_name": "Type 2 diabetes", "visit_id": 1}, {"diagnosis_name": "Type 2 diabetes", "visit_id": 2}]
+    }
+
+    merged = JSONMerger().merge_results([partial])
+
+    assert [record["visit_id"] for record in merged["medication"]] == [1, 2]
+    assert [record["visit_id"] for record in merged["diagnosis"]] == [1, 2]
+
+def test_same_visit_across_partials_is_collapsed_with_remapped_visit_id():
+    first = {"visit": [visit(1, "2024-01-05")], "medication": [dict(METFORMIN, visit_id=1)]}
+    second = {"visit": [visit(7, "2024-02-05"), visit(3, "2024-01-05")],
+              "medication": [dict(METFORMIN, visit_id=3, route="PO"), dict(METFORMIN, visit_id=7)]}
+
+    merged = JSONMerger().merge_results([first, second])
+
+    assert [(record["visit_id"], record.get("route")) for record in merged["medication"]] == [(1, "PO"), (2, None)]
+
+def test_duplicates_within_one_partial_are_not_collapsed():
+    partial = {"visit": [visit(1, "2024-01-05")], "medication": [dict(METFORMIN, visit_id=1), dict(METFORMIN, visit_id=1)]}
+    repeat = {"visit": [visit(1, "2024-01-05")], "medication": [dict(METFORMIN, visit_id=1)]}
+
+    merged = JSONMerger().merge_results([partial, repeat])
+
+    assert len(merged["medication"]) == 2
+
+def test_records_without_visit_id_are_not_attached_to_a_visit_without_id():
+    partial = {"visit": [{"visit_date": "2024-01-05", "visit_type": "office"}],
+               "medication": [dict(METFORMIN)], "diagnosis": [{"diagnosis_name": "Type 2 diabetes"}]}
+
+    merged = JSONMerger().merge_results([partial])
+
+    assert merged["visit"][0]["visit_id"] == 1
+    assert merged["medication"][0]["visit_id"] is None
+    assert merged["diagnosis"][0]["visit_id"] is None
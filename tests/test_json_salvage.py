@@ -0,0 +1,18 @@
+import pytest
+
+from utils.json_salvage import salvage_json
+
+def test_complete_object_inside_prose_and_fences():
+    assert salvage_json('Here you go:\n```json\n{"patient": {"first_name": "Ann"}}\n```') == {"patient": {"first_name": "Ann"}}
+
+def test_truncated_response_keeps_finished_sections_and_records():
+    text = '{"patient": {"first_name": "Ann"}, "visit": [{"visit_id": 1}, {"visit_id": 2, "visit_da'
+    assert salvage_json(text) == {"patient": {"first_name": "Ann"}, "visit": [{"visit_id": 1}]}
+
+def test_nested_record_is_never_returned_for_an_unsalvageable_object():
+    with pytest.raises(ValueError):
+        salvage_json('{"visit": [{"visit_id": 1, "department": {"department_name": "A')
+
+def test_later_top_level_object_is_still_found():
+    text = 'Draft: {"visit": [{"visit_id": 1, "note": "{\\"x\\": 1}" oops}]}\nFinal: {"patient": {"first_name": "Ann"}}'
+    assert salvage_json(text) == {"patient": {"first_name": "Ann"}}
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+
+from langchain.schema import Document
+
+from tools.analyze_doc import DocAnalyzer
+from tools.fake_llm import FakeLLM
+from utils.llm_cache import LLMResponseCache
+
+TRUNCATED = '{"patient": {"first_name": "Ann"}, "visit": [{"visit_id": 1}, {"visit_id": 2, "visit_da'
+COMPLETE = '{"patient": {"first_name": "Ann"}, "visit": [{"visit_id": 1}, {"visit_id": 2}]}'
+
+def make_analyzer(tmp_path, replies):
+    llm = FakeLLM(lambda prompt: replies.pop(0))
+    return DocAnalyzer(None, llm=llm, response_cache=LLMResponseCache(str(tmp_path / "llm.db"))), llm
+
+def test_salvaged_response_is_requested_again(tmp_path):
+    analyzer, llm = make_analyzer(tmp_path, [TRUNCATED, COMPLETE])
+    group = [Document(page_content="Visit 2024-01-02")]
+
+    assert analyzer.request_group(group, 7, "schema") == '{"patient": {"first_name": "Ann"}, "visit": [{"visit_id": 1}]}'
+    assert analyzer.request_group(group, 7, "schema") == COMPLETE
+    # The complete answer is cached
+    assert analyzer.request_group(group, 7, "schema") == COMPLETE
+    assert llm.calls == 2
+
+def test_salvaged_async_response_is_not_cached(tmp_path):
+    analyzer, llm = make_analyzer(tmp_path, [TRUNCATED, COMPLETE])
+    group = [Document(page_content="Visit 2024-01-02")]
+
+    asyncio.run(analyzer.arequest_group(group, 7, "schema"))
+    asyncio.run(analyzer.arequest_group(group, 7, "schema"))
+    asyncio.run(analyzer.arequest_group(group, 7, "schema"))
+
+    assert llm.calls == 2
+
+def test_repair_prompts_are_cached_when_complete(tmp_path):
+    from utils.section_repair import REPAIR_PROMPT_TEMPLATE
+
+    analyzer, llm = make_analyzer(tmp_path, [TRUNCATED, COMPLETE])
+
+    analyzer.invoke_prompt("Fix visit 2", REPAIR_PROMPT_TEMPLATE)
+    assert analyzer.invoke_prompt("Fix visit 2", REPAIR_PROMPT_TEMPLATE) == COMPLETE
+    assert analyzer.invoke_prompt("Fix visit 2", REPAIR_PROMPT_TEMPLATE) == COMPLETE
+    assert llm.calls == 2
@@ -0,0 +1,51 @@
+from utils.page_dedup import PageDeduplicator
+
+VITALS = "Vitals: BP 120/80 mmHg, HR 72, Temp 98.6 F, SpO2 98% on room air, weight 82 kg, height 180 cm"
+NOTICE = ("This record contains confidential patient information protected under state and federal law; "
+          "redisclosure without written consent is prohibited.")
+
+def join_pages(*pages) -> str:
+    return "\n\n<!-- PAGE BREAK -->\n\n".join(pages)
+
+def test_same_vitals_at_two_visits_are_kept():
+    text = join_pages(f"Visit 2024-01-05 with Dr. Smith\n\n{VITALS}", f"Visit 2024-02-05 with Dr. Smith\n\n{VITALS}")
+    deduplicator = PageDeduplicator()
+
+    deduped = deduplicator.dedupe_text(text)
+
+    assert deduped.count("BP 120/80") == 2
+    assert deduplicator.provenance()["duplicate_paragraphs"] == {}
+
+def test_repeated_non_clinical_paragraph_is_dropped():
+    text = join_pages(f"Visit 2024-01-05\n\n{NOTICE}", f"Visit 2024-02-05\n\n{NOTICE}")
+    deduplicator = PageDeduplicator()
+
+    deduped = deduplicator.dedupe_text(text)
+
+    assert deduped.count("redisclosure") == 1
+    assert deduplicator.provenance()["duplicate_paragraphs"] == {1: [2]}
+
+def test_exact_duplicate_page_is_dropped():
+    page = f"Visit 2024-01-05 with Dr. Smith\n\n{VITALS}\n\n{NOTICE}"
+    deduplicator = PageDeduplicator()
+
+    deduplicator.dedupe_text(join_pages(page, page))
+
+    assert deduplicator.provenance()["pages"] == {1: [1, 2]}
+    assert deduplicator.provenance()["duplicate_pages"] == {2: 1}
+
+def test_near_duplicate_page_keeps_its_header_and_clinical_lines():
+    shared = "\n".join(f"Medication list line {n}: metformin 500 mg tablet by mouth twice daily with meals" for n in range(30))
+    boilerplate = "\n".join(f"Clinic policy statement number {n} applies to all visits and all departments" for n in range(30))
+    first = f"Valley Clinic\nVisit 2024-01-05 with Dr. Smith\nPatient Jane Roe\n{shared}\n{boilerplate}"
+    second = f"Valley Clinic\nVisit 2024-02-05 with Dr. Smith\nPatient Jane Roe\n{shared}\n{boilerplate}\nFollow up in 3 months"
+    deduplicator = PageDeduplicator()
+
+    deduplicator.dedupe_text(join_pages(first, second))
+
+    reduced = deduplicator.pages[1]["markdown"].splitlines()
+    assert deduplicator.duplicate_pages == {2: 1}
+    assert reduced[:3] == ["Valley Clinic", "Visit 2024-02-05 with Dr. Smith", "Patient Jane Roe"]
+    assert sum("metformin" in line for line in reduced) == 30
+    assert not any("policy statement" in line for line in reduced)
+    assert reduced[-1] == "Follow up in 3 months"
@@ -0,0 +1,40 @@
+from utils.provider_index import ProviderIndex, name_parts
+
+def provider_key(name, npi=None, specialty=None):
+    return (name, npi, specialty, None, None)
+
+def make_index() -> ProviderIndex:
+    index = ProviderIndex()
+    index.put_providers({
+        provider_key("John Smith", "1111111111", "Internal Medicine"): 1,
+        provider_key("Maria Garcia", "2222222222", "Cardiology"): 2,
+        provider_key("Christopher Lee", None, "Family Medicine"): 3
+    })
+    return index
+
+def test_name_parts():
+    assert name_parts("Dr. John A. Smith MD") == ("smith", ("john", "a"))
+    assert name_parts("SMITH, JOHN A") == ("smith", ("john", "a"))
+    assert name_parts("Maria Garcia-Lopez, MD") == ("garcialopez", ("maria",))
+
+def test_name_variants_of_the_same_provider_match():
+    index = make_index()
+    keys = [provider_key("Dr. John Smith MD"), provider_key("SMITH, JOHN"), provider_key("J. Smith"),
+            provider_key("Dr. Smith", specialty="Internal Medicine"), provider_key("Chrlstopher Lee")]
+
+    assert index.get_providers(keys) == dict(zip(keys, [1, 1, 1, 1, 3]))
+
+def test_different_clinicians_with_similar_names_do_not_match():
+    index = make_index()
+    keys = [provider_key("Joan Smith"), provider_key("Jon Smith"),
+            provider_key("Mario Garcia", specialty="Cardiology"), provider_key("John Smyth")]
+
+    assert index.get_providers(keys) == {}
+
+def test_conflicting_npi_or_ambiguous_initial_does_not_match():
+    index = make_index()
+    index.put_providers({provider_key("Jane Smith", None, "Pediatrics"): 4})
+
+    assert index.get_providers([provider_key("John Smith", "9999999999")]) == {}
+    assert index.get_providers([provider_key("J. Smith")]) == {}
+    assert index.get_providers([provider_key("Dr. Smith")]) == {}
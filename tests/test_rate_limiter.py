@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+from utils.rate_limiter import AsyncConcurrencyLimiter, AsyncRateLimiter
+
+def run_in_threads(target, count: int) -> None:
+    """Each thread runs target in its own event loop, like batch workers calling asyncio.run per document"""
+    threads = [threading.Thread(target=lambda: asyncio.run(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_rate_limit_is_shared_across_event_loops(monkeypatch):
+    limiter = AsyncRateLimiter(requests_per_minute=4)
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def record_sleep(seconds):
+        delays.append(seconds)
+        await real_sleep(0)
+    monkeypatch.setattr(asyncio, "sleep", record_sleep)
+
+    run_in_threads(limiter.acquire, 6)
+
+    # Four requests start now; the other two wait for the minute to roll over, whichever loop they run on
+    assert len(delays) == 2
+    assert all(55 < delay <= 60 for delay in delays)
+
+def test_concurrency_limit_is_shared_across_event_loops():
+    limiter = AsyncConcurrencyLimiter(max_concurrency=2)
+    lock, state = threading.Lock(), {"active": 0, "peak": 0}
+
+    async def request():
+        async with limiter:
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.02)
+            await asyncio.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+
+    async def requests():
+        await asyncio.gather(*(request() for _ in range(3)))
+
+    run_in_threads(requests, 4)
+
+    assert state["peak"] == 2
+    assert limiter._active == 0 and not limiter._waiters
+
+def test_cancelled_waiter_releases_its_slot():
+    limiter = AsyncConcurrencyLimiter(max_concurrency=1)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        limiter.release()
+
+    asyncio.run(scenario())
+    assert limiter._active == 0
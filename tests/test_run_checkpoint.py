@@ -0,0 +1,21 @@
+from utils.run_checkpoint import RunCheckpoint
+
+def test_same_file_name_in_different_folders_gets_separate_run_dirs(tmp_path):
+    runs = str(tmp_path / "runs")
+    first = RunCheckpoint(runs, 7, "/data/clinicA/chart.pdf")
+    first.save("saved", {"patient_id": 7})
+
+    second = RunCheckpoint(runs, 7, "/data/clinicB/chart.pdf", resume=True)
+
+    assert second.run_dir != first.run_dir
+    assert not second.has("saved")
+    assert RunCheckpoint(runs, 7, "/data/clinicA/chart.pdf", resume=True).has("saved")
+
+def test_source_id_keeps_the_run_dir_when_the_file_moves(tmp_path):
+    runs = str(tmp_path / "runs")
+    RunCheckpoint(runs, 7, "/data/inbox/chart.pdf", source_id="mrn-7/chart").save("scrape", "text")
+
+    moved = RunCheckpoint(runs, 7, "/data/archive/chart.pdf", resume=True, source_id="mrn-7/chart")
+
+    assert moved.has("scrape")
+    assert moved.load("scrape") == "text"
@@ -1,41 +1,23 @@
-# Manages prompt generation and LLM call 
+# Manages prompt generation and LLM call
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains.question_answering import load_qa_chain
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain.chains import StuffDocumentsChain
-from langchain.chains.llm import LLMChain
 from langchain.prompts import PromptTemplate
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.json_merger import JSONMerger
+from utils.rate_limiter import AsyncConcurrencyLimiter, AsyncRateLimiter, retry_with_backoff
+from utils.json_salvage import salvage_json_status
+from utils.metrics import metrics
+import threading
+import asyncio
+import json
+import time
 import os
 
-class DocAnalyzer:
-    def __init__ (self, API_key):
-        self.google_api_key = API_key
-
-    def chunk_text(self, text, chunk_size=1000, chunk_overlap=100):
-        """Split text into chunks for processing"""
-        try:
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-            documents = splitter.create_documents([text])
-            return documents
-        except Exception as e:
-            print(f"Error chunking text: {e}")
-            return [Document(page_content=text)]
-    
-    def ask_questions_on_chunks(self, docs, patient_id, json_prompt):
-        """Ask questions on document chunks using Gemini with Pydantic validation"""
-        try:
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash",
-                google_api_key=self.google_api_key,
-                temperature=0.1
-            )
-
-            prompt_template = """
+# Static instructions and schema come first and per-document values last, so the prompt prefix stays identical across requests
+PROMPT_TEMPLATE = """
             Extract medical information and return as valid JSON matching the expected schema structure.
 
             IMPORTANT INSTRUCTIONS:
@@ -45,39 +27,362 @@ class DocAnalyzer:
             4. If specific fields are not mentioned, leave them as null/None
             5. Be conservative - only include data you can clearly identify from the text
             6. Return valid JSON format only
-            7. For patient_id field, use the provided patient_id: {patient_id}
+            7. For patient_id fields, use the Patient ID given after the schema
             8. Use string format for all dates (e.g., "2013-12-30" or "12/30/2013")
 
             Expected JSON structure with exact field names:
             {json_prompt}
 
-            Use these EXACT field names. Always include patient_id with value {patient_id} where required. 
+            Use these EXACT field names. Always include patient_id where required.
+
+            Patient ID: {patient_id}
 
             Context:
             {context}
             """
 
-            prompt = PromptTemplate(template=prompt_template, input_variables=["context", "patient_id","json_prompt"])
-            llm_chain = LLMChain(llm=llm, prompt=prompt)
-            stuff_chain = StuffDocumentsChain(llm_chain=llm_chain, document_variable_name="context")
+class DocAnalyzer:
+    def __init__ (self, API_key, model="gemini-2.5-flash", temperature=0.1, llm=None,
+                  max_concurrency=8, requests_per_minute=None, max_retries=5, response_cache=None, output_schema=None,
+                  chunk_router=None):
+        """
+        llm: optional pre-built chat client (e.g. tools.fake_llm.FakeLLM); Gemini is created lazily otherwise.
+        max_concurrency / requests_per_minute / max_retries: limits shared by every async request of this analyzer,
+        across threads and event loops (batch workers each run their own asyncio.run loop).
+        response_cache: optional utils.llm_cache.LLMResponseCache consulted before every LLM call.
+        output_schema: optional pydantic model of the whole result (JSONPromptGen.get_output_model); when given,
+        the client's structured output mode is used instead of parsing JSON out of free text.
+        chunk_router: optional tools.chunk_router.ChunkRouter applied to every chunk_text result, so empty and
+        boilerplate chunks never reach the LLM in any extraction mode.
+        """
+        self.google_api_key = API_key
+        self.model = model
+        self.temperature = temperature
+        self.llm = llm
+        self._llm_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self._concurrency_limiter = AsyncConcurrencyLimiter(max_concurrency)
+        self._rate_limiter = AsyncRateLimiter(requests_per_minute)
+        self.response_cache = response_cache
+        self.output_schema = output_schema
+        self.chunk_router = chunk_router
+        self._structured_llm = None
 
-            result = stuff_chain.invoke({
-                "input_documents": docs,
-                "patient_id": patient_id,
-                "json_prompt": json_prompt
-            })
-            result = result["output_text"]
+    def get_llm(self):
+        """Create the Gemini client once and reuse it for every request"""
+        with self._llm_lock:
+            if self.llm is None:
+                self.llm = ChatGoogleGenerativeAI(
+                    model=self.model,
+                    google_api_key=self.google_api_key,
+                    temperature=self.temperature
+                )
+            return self.llm
 
-            json_start = result.find('{')
-            json_end = result.rfind('}') + 1
-            
-            if json_start != -1 and json_end != 0:
-                json_str = result[json_start:json_end]
+    def get_runnable(self):
+        """The chat client, wrapped once with with_structured_output when an output_schema is set"""
+        if self.output_schema is None:
+            return self.get_llm()
+        llm = self.get_llm()
+        with self._llm_lock:
+            if self._structured_llm is None:
+                self._structured_llm = llm.with_structured_output(self.output_schema, include_raw=True)
+            return self._structured_llm
 
-                return json_str
-            else:
-                raise Exception
+    def chunk_text(self, text, chunk_size=1000, chunk_overlap=100, route_state=None):
+        """Split text into chunks for processing; route_state carries ChunkRouter.route state across calls for one document"""
+        try:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+            documents = splitter.create_documents([text])
+        except Exception as e:
+            print(f"Error chunking text: {e}")
+            documents = [Document(page_content=text)]
+
+        if self.chunk_router is not None:
+            return self.chunk_router.route(documents, route_state)
+        return documents
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Rough token estimate (~4 characters per token) used for sizing requests"""
+        return len(text) // 4 + 1
+
+    def group_chunks(self, docs, token_budget=None):
+        """Group consecutive chunks so each group's text stays within token_budget (one chunk per group if None)"""
+        if not token_budget:
+            return [[doc] for doc in docs]
+
+        groups, current, current_tokens = [], [], 0
+        for doc in docs:
+            tokens = self.estimate_tokens(doc.page_content)
+            if current and current_tokens + tokens > token_budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(doc)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def extract_json(self, result):
+        """Parse the JSON object out of the raw model output, keeping the complete sections of a truncated answer"""
+        return self._extract_json(result)[0]
+
+    def _extract_json(self, result):
+        obj, complete = salvage_json_status(result)
+        if not complete:
+            metrics.inc("llm_responses_salvaged")
+        return json.dumps(obj), complete
+
+    def response_to_json(self, response):
+        """JSON string from a plain chat response or from a structured-output result (include_raw=True)"""
+        return self._response_to_json(response)[0]
+
+    def _response_to_json(self, response):
+        """(JSON string, complete): complete is False when the answer was truncated and only partly salvaged"""
+        if self.output_schema is None:
+            return self._extract_json(response.content)
+
+        if response.get("parsed") is not None:
+            return response["parsed"].model_dump_json(exclude_unset=True), True
+
+        # The output did not match the schema: keep whatever the model returned for validation/repair downstream
+        raw = response.get("raw")
+        print(f"Structured output did not validate, falling back to the raw response: {response.get('parsing_error')}")
+        tool_calls = getattr(raw, "tool_calls", None)
+        if tool_calls:
+            return json.dumps(tool_calls[0]["args"]), True
+        return self._extract_json(raw.content)
+
+    def ask_questions_on_chunks(self, docs, patient_id, json_prompt):
+        """Ask questions on document chunks using Gemini with Pydantic validation"""
+        try:
+            # All chunks are stuffed into a single prompt
+            return self.request_group(docs, patient_id, json_prompt)
 
         except Exception as e:
             print(f"Error processing with Gemini: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def format_prompt(self, group, patient_id, json_prompt):
+        """Render the extraction prompt for one group of chunks"""
+        prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["context", "patient_id", "json_prompt"])
+        return prompt.format(context=self.group_context(group), patient_id=patient_id, json_prompt=self.resolve_json_prompt(group, json_prompt))
+
+    def group_context(self, group):
+        return "\n\n".join(doc.page_content for doc in group)
+
+    def resolve_json_prompt(self, group, json_prompt):
+        """
+        json_prompt may be the schema text itself or a callable that builds it from a group's text
+        (e.g. only the sections relevant to that group); every extraction mode accepts either.
+        """
+        if callable(json_prompt):
+            return json_prompt(self.group_context(group))
+        return json_prompt
+
+    def _cache_key(self, group, patient_id, json_prompt):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.make_key(self.group_context(group), PROMPT_TEMPLATE, json_prompt, patient_id, self.model, self.temperature)
+
+    def request_group(self, group, patient_id, json_prompt):
+        """Return the JSON string extracted from one group of chunks, served from the response cache when possible"""
+        json_prompt = self.resolve_json_prompt(group, json_prompt)
+        cache_key = self._cache_key(group, patient_id, json_prompt)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                metrics.inc("llm_cache_hits")
+                return cached
+            metrics.inc("llm_cache_misses")
+
+        prompt_text = self.format_prompt(group, patient_id, json_prompt)
+        start = time.perf_counter()
+        response = self.get_runnable().invoke(prompt_text)
+        self._record_llm_call(prompt_text, response, time.perf_counter() - start)
+        json_str, complete = self._response_to_json(response)
+
+        # Salvaged (truncated) answers are not cached, so the next run asks again
+        if cache_key is not None and complete:
+            self.response_cache.put(cache_key, json_str)
+        return json_str
+
+    def invoke_prompt(self, prompt_text, prompt_template=None):
+        """
+        Send an already rendered prompt (e.g. a repair request) and return the JSON string of the reply.
+        The request goes through the response cache (keyed on the rendered prompt and prompt_template), the
+        shared concurrency/rate limits and retries like extraction requests; only complete replies are cached.
+        """
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(prompt_text, prompt_template, None, None, self.model, self.temperature)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                metrics.inc("llm_cache_hits")
+                return cached
+            metrics.inc("llm_cache_misses")
+
+        start = time.perf_counter()
+        response = asyncio.run(self.ainvoke_llm(prompt_text, self.get_llm()))
+        self._record_llm_call(prompt_text, response, time.perf_counter() - start)
+        json_str, complete = self._extract_json(response.content)
+
+        if cache_key is not None and complete:
+            self.response_cache.put(cache_key, json_str)
+        return json_str
+
+    def _record_llm_call(self, prompt_text, response, seconds):
+        """LLM latency and token counters (provider-reported usage when available, estimated otherwise)"""
+        if not metrics.enabled:
+            return
+        message = response.get("raw") if isinstance(response, dict) else response
+        usage = getattr(message, "usage_metadata", None) or {}
+        metrics.observe("llm_request", seconds)
+        metrics.inc("llm_requests")
+        metrics.inc("llm_input_tokens", usage.get("input_tokens") or self.estimate_tokens(prompt_text))
+        metrics.inc("llm_output_tokens", usage.get("output_tokens") or self.estimate_tokens(str(getattr(message, "content", "") or "")))
+
+    async def arequest_group(self, group, patient_id, json_prompt):
+        """Async counterpart of request_group"""
+        json_prompt = self.resolve_json_prompt(group, json_prompt)
+        cache_key = self._cache_key(group, patient_id, json_prompt)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                metrics.inc("llm_cache_hits")
+                return cached
+            metrics.inc("llm_cache_misses")
+
+        prompt_text = self.format_prompt(group, patient_id, json_prompt)
+        start = time.perf_counter()
+        response = await self.ainvoke_llm(prompt_text)
+        self._record_llm_call(prompt_text, response, time.perf_counter() - start)
+        json_str, complete = self._response_to_json(response)
+
+        if cache_key is not None and complete:
+            self.response_cache.put(cache_key, json_str)
+        return json_str
+
+    def ask_questions_map_reduce(self, docs, patient_id, json_prompt, token_budget=None, max_workers=4):
+        """
+        Extract each chunk group (sized to token_budget) in parallel and merge the partial JSON results.
+        A failed group is reported and skipped instead of losing the whole document.
+        """
+        groups = self.group_chunks(docs, token_budget)
+
+        def extract_group(group):
+            return json.loads(self.request_group(group, patient_id, json_prompt))
+
+        partials = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(extract_group, group) for group in groups]
+            for idx, future in enumerate(futures):
+                try:
+                    partials.append(future.result())
+                except Exception as e:
+                    print(f"Error processing chunk group {idx + 1}/{len(groups)} with Gemini: {e}")
+
+        if not partials:
+            return None
+
+        merged = JSONMerger().merge_results(partials)
+        return json.dumps(merged)
+
+    def iter_analyze_stream(self, pages, patient_id, json_prompt, token_budget=4000, max_workers=4, chunk_size=1000, chunk_overlap=100):
+        """
+        Consume an iterator of {"page": n, "markdown": ...} (e.g. PDFScraper.iter_pages_landingai) and yield
+        partial JSON results as they complete. A chunk group is sent to the LLM as soon as it reaches
+        token_budget, while later pages are still being scraped; only the current group is held in memory.
+        """
+        def submit(executor, group):
+            first, last = group[0].metadata.get("page"), group[-1].metadata.get("page")
+            future = executor.submit(lambda: json.loads(self.request_group(group, patient_id, json_prompt)))
+            pending[future] = (first, last)
+
+        def collect(done):
+            for future in done:
+                first, last = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print(f"Error processing pages {first}-{last} with Gemini: {e}")
+
+        pending = {}
+        group, group_tokens = [], 0
+        route_state = {}  # running headers are counted across pages
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page in pages:
+                for doc in self.chunk_text(page["markdown"], chunk_size, chunk_overlap, route_state):
+                    doc.metadata["page"] = page["page"]
+                    tokens = self.estimate_tokens(doc.page_content)
+                    if group and group_tokens + tokens > token_budget:
+                        submit(executor, group)
+                        group, group_tokens = [], 0
+                    group.append(doc)
+                    group_tokens += tokens
+
+                # Hand back whatever finished while this page was being scraped
+                yield from collect([future for future in pending if future.done()])
+
+            if group:
+                submit(executor, group)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+    def analyze_stream(self, pages, patient_id, json_prompt, token_budget=4000, max_workers=4):
+        """Pipelined scrape + extraction over a page stream; returns the merged JSON string like the other modes"""
+        partials = list(self.iter_analyze_stream(pages, patient_id, json_prompt, token_budget, max_workers))
+        if not partials:
+            return None
+
+        merged = JSONMerger().merge_results(partials)
+        return json.dumps(merged)
+
+    async def ainvoke_llm(self, prompt_text, llm=None):
+        """Send one prompt under the concurrency and requests-per-minute limits, retrying 429/5xx responses"""
+        llm = llm or self.get_runnable()
+
+        async def request():
+            async with self._concurrency_limiter:
+                await self._rate_limiter.acquire()
+                return await llm.ainvoke(prompt_text)
+
+        return await retry_with_backoff(request, max_retries=self.max_retries)
+
+    async def analyze_async(self, docs, patient_id, json_prompt, token_budget=None):
+        """Async map-reduce extraction: every chunk group is requested concurrently and the partial results merged"""
+        groups = self.group_chunks(docs, token_budget)
+
+        async def extract_group(group):
+            return json.loads(await self.arequest_group(group, patient_id, json_prompt))
+
+        outcomes = await asyncio.gather(*(extract_group(group) for group in groups), return_exceptions=True)
+        partials = []
+        for idx, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error processing chunk group {idx + 1}/{len(groups)} with Gemini: {outcome}")
+            else:
+                partials.append(outcome)
+
+        if not partials:
+            return None
+
+        merged = JSONMerger().merge_results(partials)
+        return json.dumps(merged)
+
+    async def analyze_many_async(self, requests):
+        """
+        Run analyze_async for many documents at once; requests is a list of dicts with
+        docs, patient_id, json_prompt and optional token_budget. Results are returned in order.
+        """
+        return await asyncio.gather(*(
+            self.analyze_async(r["docs"], r["patient_id"], r["json_prompt"], r.get("token_budget"))
+            for r in requests
+        ))
@@ -0,0 +1,128 @@
+# Cheap local pre-classification of document chunks: strips layout noise, drops empty/boilerplate chunks and tags the rest with their likely schema sections
+
+from utils.section_selector import SectionSelector
+from utils.metrics import metrics
+import re
+
+# LandingAI markdown markup that carries no clinical content (chunk anchors, comments/page breaks, logo/signature/barcode figures)
+LAYOUT_NOISE = [
+    re.compile(r"<a id=['\"][^'\"]*['\"]>\s*</a>", re.IGNORECASE),
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"<::\s*(?:logo|signature|barcode|qr code|stamp)\b.*?::>", re.IGNORECASE | re.DOTALL)
+]
+
+# Page separator in LandingAI markdown
+PAGE_BREAK = re.compile(r"\n*<!--\s*PAGE BREAK\s*-->\n*", re.IGNORECASE)
+
+# Lines dropped wherever they appear: page numbers, fax transmission headers, separators
+NOISE_LINES = re.compile(
+    r"^\s*(?:"
+    r"page\s+\d+(?:\s+(?:of|/)\s+\d+)?"
+    r"|printed\s+(?:by|on|at)\b.*"
+    r"|fax\s*(?:from|to|#|no\.?|number)?\s*:?\s*[\d()+\-\s.]*"
+    r"|[-_=*\s]+"
+    r")\s*$",
+    re.IGNORECASE
+)
+
+# Cues of pages that never hold clinical entities: fax covers, confidentiality notices, billing/insurance, blank scans
+BOILERPLATE_KEYWORDS = [
+    "fax cover", "cover sheet", "facsimile", "number of pages", "pages including cover", "confidentiality notice",
+    "intended recipient", "if you have received this", "please notify the sender", "intentionally left blank",
+    "amount due", "balance due", "total charges", "payment due", "remit to", "statement date", "account number",
+    "invoice", "explanation of benefits", "claim number", "insurance claim", "authorization to release",
+    "release of information", "hipaa", "page left blank"
+]
+
+class ChunkRouter:
+    def __init__(self, selector: SectionSelector = None, min_chars: int = 40, boilerplate_keywords: list = None,
+                 header_max_chars: int = 80, header_edge_lines: int = 2):
+        """
+        selector: tags chunks with schema sections (SectionSelector by default).
+        min_chars: chunks with fewer letters/digits once layout noise is removed are dropped as empty.
+        boilerplate_keywords: cue phrases of non-clinical pages (BOILERPLATE_KEYWORDS by default).
+        header_max_chars / header_edge_lines: running headers/footers are lines of at most header_max_chars
+        among the first or last header_edge_lines lines of a page.
+        """
+        self.selector = selector or SectionSelector()
+        self.min_chars = min_chars
+        self.header_max_chars = header_max_chars
+        self.header_edge_lines = header_edge_lines
+        self._boilerplate = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(word) for word in sorted(boilerplate_keywords or BOILERPLATE_KEYWORDS, key=len, reverse=True)) + r")(?!\w)",
+            re.IGNORECASE
+        )
+
+    def route(self, docs: list, state: dict = None) -> list:
+        """
+        Clean each chunk in place and return the ones worth sending to the LLM, each tagged with
+        doc.metadata["sections"]. Running headers/footers repeated across chunks are kept only the first time,
+        so a repeated patient banner still reaches the LLM once; a chunk that header stripping alone would
+        leave empty keeps its headers instead.
+        state: dict the caller keeps for one document when it routes the document in several calls (one per
+        page in stream mode), so headers are counted across calls; a header is then stripped from the first
+        page on which it is known to repeat.
+        """
+        state = {} if state is None else state
+        routed, dropped = [], {"empty": 0, "boilerplate": 0}
+        seen_lines = state.setdefault("seen_lines", set())
+        repeated = self._repeated_lines(docs, state.setdefault("header_counts", {}))
+        for doc in docs:
+            text = self.clean(doc.page_content, drop_lines=repeated & seen_lines)
+            reason = self.drop_reason(text)
+            if reason == "empty" and repeated & seen_lines:
+                text = self.clean(doc.page_content)
+                reason = self.drop_reason(text)
+            if reason is not None:
+                dropped[reason] += 1
+                continue
+            seen_lines.update(line.strip() for line in text.splitlines())
+            doc.page_content = text
+            doc.metadata["sections"] = self.selector.select(text)
+            routed.append(doc)
+
+        for reason, count in dropped.items():
+            if count:
+                metrics.inc("chunks_dropped", count, reason=reason)
+        metrics.inc("chunks_routed", len(routed))
+        return routed
+
+    def clean(self, text: str, drop_lines: set = frozenset()) -> str:
+        """Remove layout markup, noise lines and drop_lines (compared stripped)"""
+        for pattern in LAYOUT_NOISE:
+            text = pattern.sub("", text)
+
+        lines = [line.rstrip() for line in text.splitlines() if not NOISE_LINES.match(line) and line.strip() not in drop_lines]
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+    def drop_reason(self, text: str):
+        """Why a cleaned chunk should not be sent ("empty" or "boilerplate"), or None; boilerplate needs at least as many non-clinical cues as clinical ones"""
+        if sum(char.isalnum() for char in text) < self.min_chars:
+            return "empty"
+        boilerplate_hits = len(self._boilerplate.findall(text))
+        if boilerplate_hits and boilerplate_hits >= self.selector.count_cues(text):
+            return "boilerplate"
+        return None
+
+    def _repeated_lines(self, docs: list, counts: dict, min_repeats: int = 3) -> set:
+        """
+        Running headers/footers of scanned pages: short lines without clinical cue words found at the top or
+        bottom of a page in at least min_repeats chunks (counted in counts, which may hold earlier calls' chunks).
+        Repeated clinical lines (the same vitals or medication at every visit) are never candidates.
+        """
+        for doc in docs:
+            for line in self._edge_lines(doc.page_content):
+                counts[line] = counts.get(line, 0) + 1
+        return {line for line, count in counts.items() if count >= min_repeats}
+
+    def _edge_lines(self, text: str) -> set:
+        """Header/footer-like lines among the first and last lines of each page of a chunk"""
+        text = PAGE_BREAK.sub("\f", text)
+        for pattern in LAYOUT_NOISE:
+            text = pattern.sub("", text)
+        edges = set()
+        for page in text.split("\f"):
+            lines = [line.strip() for line in page.splitlines() if line.strip() and not NOISE_LINES.match(line)]
+            edges.update(lines[:self.header_edge_lines] + lines[-self.header_edge_lines:])
+        return {line for line in edges
+                if 8 <= len(line) <= self.header_max_chars and not self.selector.count_cues(line)}
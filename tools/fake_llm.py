@@ -0,0 +1,88 @@
+# Local stand-in for the Gemini chat client that returns canned JSON with injected delays and errors
+
+from types import SimpleNamespace
+from typing import Callable
+import asyncio
+import random
+import json
+import time
+
+class FakeLLMError(Exception):
+    def __init__(self, status_code: int, message: str = "Injected fake LLM error"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+class FakeLLM:
+    def __init__(
+        self,
+        response: dict | str | Callable[[str], dict | str] = None,
+        delay: float | tuple[float, float] = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        seed: int | None = None
+    ):
+        """
+        response: canned JSON (dict or str) or a callable building one from the prompt text.
+        delay: fixed seconds or a (min, max) range per call.
+        error_rate: probability that a call raises FakeLLMError(error_status).
+        """
+        self.response = response if response is not None else {}
+        self.delay = delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def _next(self, prompt) -> tuple[float, Exception | None, str]:
+        self.calls += 1
+        delay = self.random.uniform(*self.delay) if isinstance(self.delay, tuple) else self.delay
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return delay, FakeLLMError(self.error_status), ""
+
+        response = self.response(str(prompt)) if callable(self.response) else self.response
+        content = response if isinstance(response, str) else json.dumps(response)
+        return delay, None, content
+
+    def invoke(self, prompt):
+        delay, error, content = self._next(prompt)
+        time.sleep(delay)
+        if error:
+            raise error
+        return SimpleNamespace(content=content)
+
+    async def ainvoke(self, prompt):
+        delay, error, content = self._next(prompt)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return SimpleNamespace(content=content)
+
+    def with_structured_output(self, schema, include_raw: bool = False, **kwargs):
+        """Mimics LangChain's structured output: the canned response is validated against schema"""
+        return FakeStructuredLLM(self, schema, include_raw)
+
+class FakeStructuredLLM:
+    def __init__(self, llm: FakeLLM, schema, include_raw: bool = False):
+        self.llm = llm
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _parse(self, response):
+        parsed, parsing_error = None, None
+        try:
+            parsed = self.schema.model_validate_json(response.content)
+        except Exception as e:
+            if not self.include_raw:
+                raise
+            parsing_error = e
+        if self.include_raw:
+            return {"raw": SimpleNamespace(content=response.content, tool_calls=[]), "parsed": parsed, "parsing_error": parsing_error}
+        return parsed
+
+    def invoke(self, prompt):
+        return self._parse(self.llm.invoke(prompt))
+
+    async def ainvoke(self, prompt):
+        return self._parse(await self.llm.ainvoke(prompt))
@@ -0,0 +1,32 @@
+# Local stand-in for PDFScraper that serves pre-built page markdown with injected delays
+
+import random
+import time
+
+class FakeScraper:
+    def __init__(self, documents: dict[str, list[str]], delay: float | tuple[float, float] = 0.0, seed: int | None = None):
+        """
+        documents: {pdf path: [page markdown, ...]} returned instead of parsing the pdf.
+        delay: fixed seconds or a (min, max) range per document (spread over pages when streaming).
+        """
+        self.documents = documents
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _sleep(self, fraction: float = 1.0) -> None:
+        delay = self.random.uniform(*self.delay) if isinstance(self.delay, tuple) else self.delay
+        time.sleep(delay * fraction)
+
+    def extract_text_from_pdf_landingai(self, file_path: str, bypass_cache: bool = False):
+        self.calls += 1
+        self._sleep()
+        return "\n\n<!-- PAGE BREAK -->\n\n".join(self.documents.get(file_path, []))
+
+    def iter_pages_landingai(self, file_path: str, pages_per_batch: int = 10, bypass_cache: bool = False):
+        self.calls += 1
+        pages = self.documents.get(file_path, [])
+        for start in range(0, len(pages), pages_per_batch):
+            self._sleep(min(pages_per_batch, len(pages) - start) / len(pages))
+            for number, markdown in enumerate(pages[start:start + pages_per_batch], start=start + 1):
+                yield {"page": number, "markdown": markdown}
@@ -1,21 +1,107 @@
 # Performs PDF scraping using Landing AI
 from agentic_doc.parse import parse
+from utils.metrics import metrics
+import tempfile
 import os
 
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
 class PDFScraper:
-    def extract_text_from_pdf_landingai(self, file_path: str):
-        """Extract text from PDF using Landing AI"""
-        try:
-            if parse is None:
-                raise ImportError("agentic_doc.parse not available")
+    def __init__(self, cache=None):
+        """cache: optional tools.scrape_cache.ScrapeCache reused across runs"""
+        self.cache = cache
+
+    def extract_text_from_pdf_landingai(self, file_path: str, bypass_cache: bool = False):
+        """
+        Extract text from PDF using Landing AI (served from the scrape cache when available).
+        Returns "" when nothing was extracted; read and parse errors propagate, as in iter_pages_landingai,
+        so the caller reports the document as failed with the cause.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for(file_path)
+            if not bypass_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    metrics.inc("scrape_cache_hits")
+                    print("Loaded scraped text from cache")
+                    return cached["markdown"]
+                metrics.inc("scrape_cache_misses")
 
+        with metrics.stage("landingai_parse"):
             result = parse(file_path)
-            if result and len(result) > 0:
-                parsed_doc = result[0]
-                return result[0].markdown
-            else:
-                print("No content extracted from PDF")
-                return ""
-        except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
+        if result and len(result) > 0:
+            parsed_doc = result[0]
+            if cache_key is not None and parsed_doc.markdown:
+                self.cache.put(cache_key, parsed_doc.markdown, self.get_pages(parsed_doc))
+            return result[0].markdown
+        else:
+            print("No content extracted from PDF")
             return ""
+
+    def get_pages(self, parsed_doc, page_offset: int = 0) -> list[dict]:
+        """Group a parsed document's chunks into per-page markdown ([{"page": 1, "markdown": ...}, ...])"""
+        pages = {}
+        for chunk in getattr(parsed_doc, "chunks", None) or []:
+            grounding = getattr(chunk, "grounding", None) or []
+            page = grounding[0].page if grounding else 0
+            pages.setdefault(page + page_offset + 1, []).append(chunk.text)
+        if not pages and getattr(parsed_doc, "markdown", None):
+            return [{"page": page_offset + 1, "markdown": parsed_doc.markdown}]
+        return [{"page": page, "markdown": "\n\n".join(texts)} for page, texts in sorted(pages.items())]
+
+    def iter_pages_landingai(self, file_path: str, pages_per_batch: int = 10, bypass_cache: bool = False):
+        """
+        Yield {"page": n, "markdown": ...} (1-based page numbers) as soon as each page is parsed.
+        The pdf is split into batches of pages_per_batch pages that are parsed one after another, so
+        consumers can start on early pages while later ones are still being processed. Without pypdf
+        the whole document is parsed first and its pages are yielded afterwards.
+        Read and parse errors propagate (a failed batch must not pass for the end of the document).
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for(file_path)
+            if not bypass_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None and cached.get("pages"):
+                    metrics.inc("scrape_cache_hits")
+                    print("Loaded scraped pages from cache")
+                    yield from cached["pages"]
+                    return
+                metrics.inc("scrape_cache_misses")
+
+        scraped_pages = [] if cache_key is not None else None
+        for page in self._parse_in_batches(file_path, pages_per_batch):
+            if scraped_pages is not None:
+                scraped_pages.append(page)
+            yield page
+
+        if scraped_pages:
+            markdown = "\n\n".join(page["markdown"] for page in scraped_pages)
+            self.cache.put(cache_key, markdown, scraped_pages)
+
+    def _parse_in_batches(self, file_path: str, pages_per_batch: int):
+        if PdfReader is None:
+            result = parse(file_path)
+            if result:
+                yield from self.get_pages(result[0])
+            return
+
+        reader = PdfReader(file_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for start in range(0, len(reader.pages), pages_per_batch):
+                writer = PdfWriter()
+                for page in reader.pages[start:start + pages_per_batch]:
+                    writer.add_page(page)
+                batch_path = os.path.join(tmp_dir, f"pages_{start + 1}.pdf")
+                with open(batch_path, "wb") as f:
+                    writer.write(f)
+
+                with metrics.stage("landingai_parse"):
+                    result = parse(batch_path)
+                if result:
+                    yield from self.get_pages(result[0], page_offset=start)
+                os.remove(batch_path)
@@ -0,0 +1,68 @@
+# Runs the extraction pipeline over a manifest of pdfs using a bounded worker pool
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+import json
+import time
+import csv
+import os
+
+class BatchRunner:
+    def __init__(self, process_job: Callable[[dict], None], max_workers: int = 4):
+        self.process_job = process_job
+        self.max_workers = max_workers
+
+    def load_manifest(self, manifest_filepath: str) -> list[dict]:
+        """
+        Loads jobs from a .csv (with header row) or .jsonl manifest.
+        Each job requires a patient_id and a pdf_path; an optional source_id identifies the document for
+        incremental re-ingestion (defaults to the pdf's full path).
+        """
+        if manifest_filepath.lower().endswith(".jsonl"):
+            with open(manifest_filepath, "r", encoding="utf-8") as f:
+                jobs = [json.loads(line) for line in f if line.strip()]
+        else:
+            with open(manifest_filepath, "r", encoding="utf-8", newline="") as f:
+                jobs = [dict(row) for row in csv.DictReader(f)]
+
+        for line_number, job in enumerate(jobs, start=1):
+            if not job.get("patient_id") or not job.get("pdf_path"):
+                raise ValueError(f"Manifest entry {line_number} is missing 'patient_id' or 'pdf_path': {job}")
+            job["patient_id"] = int(job["patient_id"])
+            job["pdf_path"] = os.path.expanduser(job["pdf_path"])
+        return jobs
+
+    def run(self, jobs: list[dict]) -> dict:
+        """Processes every job concurrently and reports per-document status plus aggregate throughput"""
+        results = []
+        start = time.perf_counter()
+
+        def timed_job(job):
+            job_start = time.perf_counter()
+            self.process_job(job)
+            return time.perf_counter() - job_start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(timed_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                result = {"patient_id": job["patient_id"], "pdf_path": job["pdf_path"]}
+                try:
+                    result["seconds"] = round(future.result(), 3)
+                    result["status"] = "success"
+                except Exception as e:
+                    result["status"] = "failed"
+                    result["error"] = f"{type(e).__name__}: {e}"
+                    print(f"Error processing {job['pdf_path']}: {e}")
+                results.append(result)
+
+        elapsed = time.perf_counter() - start
+        succeeded = sum(1 for r in results if r["status"] == "success")
+        return {
+            "documents": len(jobs),
+            "succeeded": succeeded,
+            "failed": len(jobs) - succeeded,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(len(jobs) / elapsed, 3) if elapsed > 0 else 0.0,
+            "results": results
+        }
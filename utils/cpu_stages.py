@@ -0,0 +1,36 @@
+# CPU-bound pipeline stages as picklable top-level functions, run in a process pool during batch runs
+
+from concurrent.futures import ProcessPoolExecutor
+from utils.json_validator import JSONValidator
+import multiprocessing
+import json
+
+def parse_and_validate(results: str, schemas_with_flags: dict) -> tuple[dict, dict]:
+    """json.loads the raw LLM result and validate it; returns JSONValidator.validate_document's (validated_data, failures)"""
+    return JSONValidator().validate_document(schemas_with_flags, json.loads(results))
+
+def validate(results_json: dict, schemas_with_flags: dict) -> tuple[dict, dict]:
+    """Validate an already parsed extraction (e.g. after repair)"""
+    return JSONValidator().validate_document(schemas_with_flags, results_json)
+
+class CPUStageExecutor:
+    def __init__(self, max_workers: int = 0):
+        """
+        max_workers > 0 runs stages in that many worker processes, so validation of one document does not hold
+        the GIL while other threads wait on LLM/database I/O. max_workers = 0 runs stages inline.
+        Workers are spawned rather than forked because the batch runner's threads may hold locks at fork time.
+        """
+        self.executor = None
+        if max_workers:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def run(self, stage, *args):
+        """Run stage(*args) and return its result; arguments and results must be picklable"""
+        if self.executor is None:
+            return stage(*args)
+        return self.executor.submit(stage, *args).result()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
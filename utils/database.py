@@ -0,0 +1,125 @@
+# Process-wide database engine, session factory, and one-time schema bootstrap
+
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine, event, text, func, select, inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from schemas.sql_schema import Base, SchemaVersion
+import threading
+
+# Bump whenever schemas/sql_schema.py changes so existing databases are re-bootstrapped
+SCHEMA_VERSION = 2
+
+_engines = {}
+_sessionmakers = {}
+_bootstrapped = set()
+_lock = threading.RLock()
+
+def build_url(db_config: dict, include_database: bool = True) -> str:
+    """MySQL url from db_config (username, password, database_name, optional host/port); db_config["url"] overrides it"""
+    if db_config.get("url"):
+        return db_config["url"]
+
+    username = db_config.get("username")
+    password = quote_plus(db_config.get("password") or "")
+    host = db_config.get("host", "localhost")
+    port = f":{db_config['port']}" if db_config.get("port") else ""
+    database_name = db_config.get("database_name") if include_database else ""
+    return f"mysql+pymysql://{username}:{password}@{host}{port}/{database_name}"
+
+def get_engine(db_config: dict, pool_size: int = None):
+    """
+    Returns the shared engine for db_config, creating it (and bootstrapping the schema) on first use.
+    Pool settings come from db_config: pool_size (default 5), max_overflow (10), pool_pre_ping (True),
+    pool_recycle (3600 seconds). pool_size overrides db_config when given.
+    """
+    url = build_url(db_config)
+    with _lock:
+        if url not in _engines:
+            if url.startswith("sqlite"):
+                engine = create_engine(url, connect_args={"timeout": db_config.get("sqlite_timeout", 30)})
+                _begin_immediate(engine)
+            else:
+                engine = create_engine(
+                    url,
+                    pool_size=pool_size or db_config.get("pool_size", 5),
+                    max_overflow=db_config.get("max_overflow", 10),
+                    pool_pre_ping=db_config.get("pool_pre_ping", True),
+                    pool_recycle=db_config.get("pool_recycle", 3600)
+                )
+            bootstrap_schema(engine, db_config)
+            _engines[url] = engine
+        return _engines[url]
+
+def _begin_immediate(engine) -> None:
+    """
+    SQLite (benchmarks/local runs): take the write lock when a transaction begins, so concurrent documents wait
+    for each other (up to sqlite_timeout seconds) instead of failing with "database is locked" on lock upgrade
+    """
+    @event.listens_for(engine, "connect")
+    def disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def get_sessionmaker(engine):
+    with _lock:
+        if engine not in _sessionmakers:
+            _sessionmakers[engine] = sessionmaker(bind=engine)
+        return _sessionmakers[engine]
+
+def get_schema_version(engine):
+    """Schema version recorded in the database, or None if the database/marker table does not exist yet"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.version))).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+def bootstrap_schema(engine, db_config: dict) -> None:
+    """Create the database and tables once per process, and only when the schema_version marker is behind"""
+    url = str(engine.url)
+    with _lock:
+        if url in _bootstrapped:
+            return
+
+        version = get_schema_version(engine)
+        if version is None or version < SCHEMA_VERSION:
+            if engine.dialect.name == "mysql":
+                # Create Database
+                server_engine = create_engine(build_url(db_config, include_database=False), poolclass=NullPool)
+                with server_engine.connect() as conn:
+                    conn.execute(text(f"CREATE DATABASE IF NOT EXISTS `{db_config.get('database_name')}`"))
+                    conn.commit()
+                server_engine.dispose()
+
+            # Create Tables (and upgrade the ones a database without the marker or an older marker already has)
+            Base.metadata.create_all(engine)
+            add_missing_columns(engine)
+            with engine.begin() as conn:
+                conn.execute(SchemaVersion.__table__.insert().values(version=SCHEMA_VERSION))
+            print(f"Database and table creation successful (schema version {SCHEMA_VERSION}).")
+
+        _bootstrapped.add(url)
+
+def add_missing_columns(engine) -> None:
+    """
+    create_all only creates missing tables; add columns and indexes introduced since an existing database was
+    bootstrapped (e.g. the version 2 document_id/natural_key/row_hash provenance columns). Added columns are
+    nullable and carry no foreign key constraint, since SQLite cannot add one to an existing table.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
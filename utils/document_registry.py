@@ -0,0 +1,86 @@
+# Registry of ingested source documents: skip unchanged charts and tie re-extracted records to their document
+
+from datetime import datetime
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session
+from schemas.sql_schema import Document
+import hashlib
+import os
+
+def file_fingerprint(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 of the file's bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extraction_version(*parts) -> str:
+    """
+    Identifies everything that shapes an extraction besides the file (schema hash, prompt template, model, prompt
+    format, ...), so a changed prompt or model re-extracts documents whose files did not change
+    """
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+def source_key(file_path: str, source_id: str = None, max_length: int = 255) -> str:
+    """
+    source_id when given, otherwise the absolute, symlink-resolved and case-normalized path.
+    Keys longer than the source_key column are replaced by their sha256.
+    """
+    key = str(source_id) if source_id not in (None, "") else os.path.normcase(os.path.realpath(file_path))
+    if len(key) > max_length:
+        key = "sha256:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return key
+
+class DocumentRegistry:
+    def __init__(self, version: str):
+        self.version = version
+
+    def describe(self, patient_id: int, pdf_input_filepath: str, source_id: str = None) -> dict:
+        """
+        Registration carried through the pipeline in data["document"] (JSON-serializable, so it survives checkpoints).
+        Documents are identified by patient and source_id (e.g. a manifest column) or else the file's full normalized
+        path, so an updated chart replaces the previous version's rows while a/chart.pdf and b/chart.pdf stay apart.
+        """
+        return {
+            "patient_id": patient_id,
+            "source_key": source_key(pdf_input_filepath, source_id),
+            "file_hash": file_fingerprint(pdf_input_filepath),
+            "extraction_version": self.version
+        }
+
+    def is_unchanged(self, SessionLocal, document: dict) -> bool:
+        """True if the same file was already ingested with the same extraction version"""
+        with SessionLocal() as session:
+            stored = self._lookup(session, document)
+            return (stored is not None and stored.file_hash == document["file_hash"]
+                    and stored.extraction_version == document["extraction_version"])
+
+    @staticmethod
+    def register(session: Session, document: dict) -> int:
+        """
+        Get or create the document's row and return its id. A new row gets an empty hash, so the document only
+        counts as ingested once mark_ingested records its hash after the records are saved (the resolve and save
+        steps commit separately when single_transaction is off).
+        """
+        stored = DocumentRegistry._lookup(session, document)
+        if stored is None:
+            stored = Document(patient_id=document["patient_id"], source_key=document["source_key"],
+                              file_hash="", extraction_version="", created_date=datetime.utcnow())
+            session.add(stored)
+            session.flush()
+        return stored.id
+
+    @staticmethod
+    def mark_ingested(session: Session, document: dict) -> None:
+        stored = session.get(Document, document["document_id"])
+        stored.file_hash = document["file_hash"]
+        stored.extraction_version = document["extraction_version"]
+        stored.updated_date = datetime.utcnow()
+        session.flush()
+
+    @staticmethod
+    def _lookup(session: Session, document: dict):
+        return session.execute(select(Document).where(and_(
+            Document.patient_id == document["patient_id"], Document.source_key == document["source_key"]
+        ))).scalar_one_or_none()
@@ -3,19 +3,163 @@
 from schemas.sql_schema import Provider, Department, Visit, Patient
 from sqlalchemy.orm import Session
 from datetime import datetime
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, insert, select, text
+from utils.metrics import metrics
+from utils.json_merger import VISIT_KEY
+from utils.upsert import complete_row, natural_key_hash, sync_document_rows
+import threading
+import logging
 import json
 
+logger = logging.getLogger(__name__)
+
+# Sections whose records reference a visit through visit_id
+VISIT_CHILD_SECTIONS = ["symptom", "diagnosis", "medication", "vitalsigns", "labresult", "imagingstudy", "proceduretreatment", "visitnotes"]
+
+# Step between the auto-increment ids a MySQL server hands out to one multi-row INSERT (None when they are not predictable), per engine url
+_autoinc_steps = {}
+
+# Nested provider objects per section (visits also carry a department and nested visit_notes)
+PROVIDER_FIELDS = {
+    "visit": ["primary_provider"],
+    "visitnotes": ["author_provider"],
+    "diagnosis": ["diagnosing_provider"],
+    "medication": ["prescribing_provider"],
+    "vitalsigns": ["measured_by"],
+    "labresult": ["ordering_provider"],
+    "imagingstudy": ["ordering_provider", "radiologist"],
+    "proceduretreatment": ["primary_provider"],
+}
+
+class ProviderDepartmentCache:
+    """Process-wide map of provider/department keys to database ids, shared across documents and threads"""
+    def __init__(self):
+        self.departments = {}
+        self.providers = {}
+        self._lock = threading.Lock()
+
+    def get_departments(self, keys):
+        with self._lock:
+            found = {key: self.departments[key] for key in keys if key in self.departments}
+        self._count_lookups(keys, found)
+        return found
+
+    def get_providers(self, keys):
+        with self._lock:
+            found = {key: self.providers[key] for key in keys if key in self.providers}
+        self._count_lookups(keys, found)
+        return found
+
+    def _count_lookups(self, keys, found):
+        metrics.inc("provider_cache_hits", len(found))
+        metrics.inc("provider_cache_misses", len(keys) - len(found))
+
+    def put_departments(self, id_map):
+        with self._lock:
+            self.departments.update(id_map)
+
+    def put_providers(self, id_map):
+        with self._lock:
+            self.providers.update(id_map)
+
 class JSONFormatter:
-    def insert_visits_and_resolve_ids(self, session: Session, data: dict) -> dict:
+    def insert_visits_and_resolve_ids(self, session: Session, data: dict, commit: bool = True) -> dict:
+        if not data.get("visit"):
+            return data
+
+        self._insert_visits_per_row(session, data)
+
+        if commit:
+            session.commit()
+        return data
+
+    def replace_visit_ids(self, data: dict, llm_to_db_id: dict) -> dict:
+        """Rewrite LLM visit_ids to database ids in every child section and drop the visit objects"""
+        for section in VISIT_CHILD_SECTIONS:
+            for obj in data.get(section) or []:
+                if isinstance(obj, dict) and obj.get("visit_id") in llm_to_db_id:
+                    obj["visit_id"] = llm_to_db_id[obj["visit_id"]]
+
+        # Replace visit objects with just real IDs
+        if "visit" in data:
+            del data["visit"]
+        return data
+
+    def insert_visits_bulk(self, session: Session, data: dict, commit: bool = True) -> dict:
+        """
+        Inserts every visit of a document in one statement and maps LLM visit_ids to database ids in bulk.
+        Uses INSERT ... RETURNING (ordered by parameters) where the dialect supports it, and a single
+        multi-row INSERT + LAST_INSERT_ID() on MySQL servers that allocate consecutive auto-increment ids
+        (innodb_autoinc_lock_mode 0 or 1). Other servers fall back to one flush per visit.
+        """
         if not data.get("visit"):
             return data
 
-        llm_to_db_id = {}  # Map LLM visit_id → DB-assigned visit.id
         visit_list = data["visit"]
-        new_visit_ids = []
+        created_date = datetime.utcnow()
+        rows = [{
+            "patient_id": visit.get("patient_id"),
+            "visit_date": visit.get("visit_date"),
+            "visit_type": visit.get("visit_type"),
+            "department_id": visit.get("department_id"),
+            "primary_provider_id": visit.get("primary_provider_id"),
+            "discharge_date": visit.get("discharge_date"),
+            "created_date": created_date
+        } for visit in visit_list]
+
+        bind = session.get_bind()
+        dialect = bind.dialect
+        step = self._autoinc_step(session) if dialect.name == "mysql" else None
+        if getattr(dialect, "insert_executemany_returning", False) and getattr(dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+            result = session.execute(insert(Visit).returning(Visit.id, sort_by_parameter_order=True), rows)
+            db_ids = list(result.scalars())
+        elif step is not None:
+            # Auto-increment ids of one multi-row INSERT start at LAST_INSERT_ID() and advance by auto_increment_increment
+            result = session.connection().execute(insert(Visit.__table__).values(rows))
+            db_ids = list(range(result.lastrowid, result.lastrowid + step * len(rows), step))
+        else:
+            self._insert_visits_per_row(session, data)
+            if commit:
+                session.commit()
+            return data
+
+        llm_to_db_id = {visit.get("visit_id"): db_id for visit, db_id in zip(visit_list, db_ids)}
+        self.replace_visit_ids(data, llm_to_db_id)
+
+        if commit:
+            session.commit()
+        return data
 
-        for visit in visit_list:
+    def upsert_visits(self, session: Session, data: dict, document_id: int, commit: bool = True) -> dict:
+        """
+        Incremental variant of insert_visits_bulk for a registered document: visits are matched to the ones the
+        document stored last time by natural key (patient, visit_date, visit_type), only new or changed visits are
+        written, and existing visits keep their ids so unchanged child records still point at them.
+        The resolved ids are kept in data["document"]["visit_ids"]; visits that disappeared are deleted with
+        their records in SQLSaver.sync_document_records.
+        """
+        rows_by_key, llm_keys = {}, []
+        for visit in data.get("visit") or []:
+            row = complete_row(Visit, visit)
+            natural_key = natural_key_hash(row, VISIT_KEY, scope=(row["patient_id"],))
+            rows_by_key[natural_key] = row
+            llm_keys.append((visit.get("visit_id"), natural_key))
+
+        sync_document_rows(session, Visit, document_id, rows_by_key, delete_stale=False)
+        key_to_id = dict(session.execute(
+            select(Visit.natural_key, Visit.id).where(Visit.document_id == document_id)
+        ).all())
+
+        self.replace_visit_ids(data, {llm_id: key_to_id[natural_key] for llm_id, natural_key in llm_keys})
+        data["document"]["visit_ids"] = sorted({key_to_id[natural_key] for natural_key in rows_by_key})
+
+        if commit:
+            session.commit()
+        return data
+
+    def _insert_visits_per_row(self, session: Session, data: dict) -> dict:
+        llm_to_db_id = {}  # Map LLM visit_id → DB-assigned visit.id
+        for visit in data["visit"]:
             llm_id = visit.get("visit_id")  # This is the temporary LLM-generated id
             visit_obj = Visit(
                 patient_id=visit.get("patient_id"),
@@ -30,26 +174,28 @@ class JSONFormatter:
             session.flush()  # Assigns visit_obj.id
 
             llm_to_db_id[llm_id] = visit_obj.id
-            new_visit_ids.append(visit_obj.id)
 
         # Replace all visit_id fields across other tables
-        def replace_visit_ids(objs):
-            for obj in objs:
-                if isinstance(obj, dict) and obj.get("visit_id") in llm_to_db_id:
-                    obj["visit_id"] = llm_to_db_id[obj["visit_id"]]
-
-        for section in ["symptom", "diagnosis", "medication", "vitalsigns", "labresult", "imagingstudy", "proceduretreatment", "visitnotes"]:
-            if section in data:
-                replace_visit_ids(data[section])
-
-        # Replace visit objects with just real IDs
-        if "visit" in data:
-            del data["visit"]
-
-        session.commit()
-        return data
+        return self.replace_visit_ids(data, llm_to_db_id)
 
-    def resolve_providers_and_departments(self, session: Session, data: dict) -> dict:
+    def _autoinc_step(self, session: Session):
+        """
+        auto_increment_increment when one multi-row INSERT gets evenly spaced ids (innodb_autoinc_lock_mode 0 or 1),
+        else None. auto_increment_offset only shifts the first id, which LAST_INSERT_ID() already reports.
+        """
+        url = str(session.get_bind().url)
+        if url not in _autoinc_steps:
+            lock_mode, increment, offset = session.execute(text(
+                "SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment, @@auto_increment_offset"
+            )).one()
+            _autoinc_steps[url] = int(increment) if int(lock_mode) in (0, 1) else None
+            if _autoinc_steps[url] is None:
+                logger.warning("innodb_autoinc_lock_mode is interleaved (2); bulk visit insert falls back to one flush per visit")
+            elif _autoinc_steps[url] != 1:
+                logger.info("auto_increment_increment is %s (offset %s); bulk visit ids are stepped accordingly", increment, offset)
+        return _autoinc_steps[url]
+
+    def resolve_providers_and_departments(self, session: Session, data: dict, commit: bool = True) -> dict:
         provider_cache = {}
         department_cache = {}
 
@@ -77,7 +223,7 @@ class JSONFormatter:
                 )
                 session.add(dept)
                 session.flush()
-                print(f"- Added new Department: {dept_dict} with ID {dept.id}")
+                logger.debug("Added new Department: %s with ID %s", dept_dict, dept.id)
 
             department_cache[key] = dept.id
             return dept.id
@@ -123,7 +269,7 @@ class JSONFormatter:
                 )
                 session.add(prov)
                 session.flush()
-                print(f"- Added new Provider: {prov_dict} with ID {prov.id}")
+                logger.debug("Added new Provider: %s with ID %s", prov_dict, prov.id)
 
             provider_cache[key] = prov.id
             return prov.id
@@ -133,7 +279,7 @@ class JSONFormatter:
                 resolved_id = resolver_func(obj[key])
                 obj[f"{key}_id"] = resolved_id
                 del obj[key]
-                print(f"- Replaced '{key}' object with ID {resolved_id}")
+                logger.debug("Replaced '%s' object with ID %s", key, resolved_id)
 
         # 🔁 Replace nested provider/department objects with IDs
         for visit in data.get("visit", []):
@@ -164,10 +310,155 @@ class JSONFormatter:
         for proc in data.get("proceduretreatment", []):
             replace_obj_with_id(proc, "primary_provider", get_or_create_provider)
 
-        session.commit()
+        if commit:
+            session.commit()
+        return data
+
+    def resolve_providers_and_departments_bulk(self, session: Session, data, cache: ProviderDepartmentCache = None,
+                                               commit: bool = True, pending_cache_updates: list = None):
+        """
+        Set-based version of resolve_providers_and_departments for one document or a list of documents.
+        Distinct department/provider keys are collected first, existing rows are fetched with one query
+        per table, missing rows are inserted with one executemany per table, and nested objects are then
+        replaced with ids in a single pass. Ids are shared through cache across calls when one is given.
+        When the caller commits later (commit=False), pass pending_cache_updates to receive the
+        (department_ids, provider_ids) maps and publish them to the cache only after its commit succeeds.
+        """
+        documents = data if isinstance(data, list) else [data]
+
+        # Collect every nested department/provider reference as (owner, field)
+        department_refs = []
+        provider_refs = []
+        for doc in documents:
+            for section, fields in PROVIDER_FIELDS.items():
+                for record in doc.get(section) or []:
+                    if not isinstance(record, dict):
+                        continue
+                    for field in fields:
+                        if isinstance(record.get(field), dict):
+                            provider_refs.append((record, field))
+                    if section == "visit":
+                        if isinstance(record.get("department"), dict):
+                            department_refs.append((record, "department"))
+                        notes = record.get("visit_notes")
+                        if isinstance(notes, dict) and isinstance(notes.get("author_provider"), dict):
+                            provider_refs.append((notes, "author_provider"))
+        for owner, field in provider_refs:
+            if isinstance(owner[field].get("department"), dict):
+                department_refs.append((owner[field], "department"))
+
+        def department_key(dept_dict):
+            return (dept_dict.get("department_name"), dept_dict.get("department_type"), dept_dict.get("system_name"))
+
+        department_ids = self._resolve_keys(
+            session, Department,
+            {department_key(owner[field]) for owner, field in department_refs},
+            ("department_name", "department_type", "system_name"),
+            cache.get_departments if cache else None
+        )
+
+        # Provider keys depend on the resolved department id
+        for owner, field in department_refs:
+            owner[f"{field}_id"] = department_ids[department_key(owner[field])]
+            del owner[field]
+
+        def provider_key(prov_dict):
+            return (
+                prov_dict.get("provider_name"),
+                prov_dict.get("npi_number"),
+                prov_dict.get("specialty"),
+                prov_dict.get("department_id"),
+                prov_dict.get("active_status", True)
+            )
+
+        provider_ids = self._resolve_keys(
+            session, Provider,
+            {provider_key(owner[field]) for owner, field in provider_refs},
+            ("provider_name", "npi_number", "specialty", "department_id", "active_status"),
+            cache.get_providers if cache else None
+        )
+
+        for owner, field in provider_refs:
+            owner[f"{field}_id"] = provider_ids[provider_key(owner[field])]
+            del owner[field]
+
+        if commit:
+            session.commit()
+
+        if pending_cache_updates is not None:
+            pending_cache_updates.append((department_ids, provider_ids))
+        elif cache is not None:
+            cache.put_departments(department_ids)
+            cache.put_providers(provider_ids)
         return data
 
-    def insert_patient_from_json(self, session: Session, data: dict) -> int:
+    def _resolve_keys(self, session: Session, model, keys: set, columns: tuple, cache_lookup=None) -> dict:
+        """Map each key tuple (values of columns) to an id, inserting rows for keys that do not exist yet"""
+        id_map = cache_lookup(keys) if cache_lookup else {}
+        missing = [key for key in keys if key not in id_map]
+        if not missing:
+            return id_map
+
+        def fetch_existing():
+            # One query narrowed by the first column (and NPI for providers); exact matching happens in Python
+            filters = []
+            for column in columns[:2] if model is Provider else columns[:1]:
+                values = {key[columns.index(column)] for key in missing}
+                attr = getattr(model, column)
+                if any(value is not None for value in values):
+                    filters.append(attr.in_([value for value in values if value is not None]))
+                if None in values:
+                    filters.append(attr.is_(None))
+            rows = session.query(model.id, *[getattr(model, column) for column in columns]).filter(or_(*filters)).order_by(model.id).all()
+
+            existing = {}
+            for row in rows:
+                existing.setdefault(match_key(row[1:]), row[0])
+                if model is Provider and row.npi_number:
+                    existing.setdefault(("npi", str(row.npi_number)), row[0])
+            return existing
+
+        def match_key(key):
+            # LLM output may give numbers where the column is a string (e.g. NPI), so compare as text
+            return tuple(value if value is None or isinstance(value, bool) else str(value) for value in key)
+
+        def lookup(key, existing):
+            if match_key(key) in existing:
+                return existing[match_key(key)]
+            npi = key[columns.index("npi_number")] if model is Provider else None
+            if npi and ("npi", str(npi)) in existing:
+                # NPI is unique, so a provider with the same NPI is the same provider
+                return existing[("npi", str(npi))]
+            return None
+
+        existing = fetch_existing()
+        to_insert = {}
+        pending_npis = set()
+        for key in missing:
+            found = lookup(key, existing)
+            if found is not None:
+                id_map[key] = found
+                continue
+            npi = key[columns.index("npi_number")] if model is Provider else None
+            if npi and str(npi) in pending_npis:
+                continue
+            if npi:
+                pending_npis.add(str(npi))
+            to_insert[key] = dict(zip(columns, key), created_date=datetime.utcnow())
+
+        if to_insert:
+            session.execute(insert(model), list(to_insert.values()))
+            existing = fetch_existing()
+            for key in missing:
+                if key not in id_map:
+                    id_map[key] = lookup(key, existing)
+                    if id_map[key] is None:
+                        raise RuntimeError(f"Could not resolve {model.__tablename__} id for {key}")
+            logger.info("Added %d new %s", len(to_insert), model.__tablename__)
+
+        return id_map
+
+    def insert_patient_from_json(self, session: Session, data: dict, commit: bool = True) -> int:
         """
         Inserts a patient from a JSON dict with structure: { "patient": { ... } }
         """ 
@@ -186,16 +477,16 @@ class JSONFormatter:
             existing = session.query(Patient).filter_by(medical_record_number=mrn).first()
 
         if existing:
-            print(f"- Patient already exists with ID {existing.id}")
+            logger.info("Patient already exists with ID %s", existing.id)
             return existing.id
 
-        # Parse dates
+        # Parse dates (already datetimes when the data went through JSONValidator.validate_document)
         created_date = patient_data.get("created_date")
-        if created_date:
+        if isinstance(created_date, str):
             created_date = datetime.fromisoformat(created_date)
 
         updated_date = patient_data.get("updated_date")
-        if updated_date:
+        if isinstance(updated_date, str):
             updated_date = datetime.fromisoformat(updated_date)
 
         # Create new patient
@@ -208,9 +499,10 @@ class JSONFormatter:
 
         session.add(new_patient)
         session.flush()  # Ensures patient_id is populated
-        print(f"- Inserted new patient with ID {new_patient.id}")
+        logger.info("Inserted new patient with ID %s", new_patient.id)
         
 
-        session.commit()
+        if commit:
+            session.commit()
         data.pop("patient", None)
         return data
@@ -0,0 +1,146 @@
+# Merges partial JSON extractions (one per chunk group) into a single record set
+
+import copy
+import re
+
+# Fields identifying the same record when it is extracted from more than one chunk
+SECTION_KEYS = {
+    "visitnotes": ("note_date", "note_type", "chief_complaint"),
+    "diagnosis": ("diagnosis_name", "icd10_code", "onset_date"),
+    "symptom": ("symptom_name", "onset_date", "reported_date"),
+    "medication": ("medication_name", "dose", "dose_unit", "frequency", "start_date"),
+    "vitalsigns": ("measurement_datetime",),
+    "labresult": ("test_name", "collection_datetime", "result_value"),
+    "imagingstudy": ("imaging_type", "body_region", "study_datetime"),
+    "proceduretreatment": ("procedure_name", "procedure_date"),
+}
+VISIT_KEY = ("visit_date", "visit_type")
+
+class JSONMerger:
+    def merge_results(self, partials: list[dict]) -> dict:
+        """
+        Merges chunk-level extractions into one document-level extraction.
+        Visits are de-duplicated and renumbered so visit_id references stay consistent across chunks,
+        records spanning chunk boundaries are collapsed, and nested providers are unified.
+        Records are keyed within their (renumbered) visit, and only copies from different partials are
+        collapsed: the same medication at two visits, or listed twice in one chunk, stays two records.
+        """
+        merged = {"patient": {}, "visit": []}
+        visit_index = {}
+        record_index = {section: {} for section in SECTION_KEYS}  # key -> [(record, indexes of partials merged into it)]
+
+        for partial_index, partial in enumerate(partials):
+            if not isinstance(partial, dict):
+                continue
+
+            if isinstance(partial.get("patient"), dict):
+                self._fill_missing(merged["patient"], partial["patient"])
+
+            # Renumber this chunk's visits into the merged visit list
+            visit_id_map = {}
+            for visit in partial.get("visit") or []:
+                if not isinstance(visit, dict):
+                    continue
+                key = self._record_key(visit, VISIT_KEY)
+                if key is not None and key in visit_index:
+                    existing = visit_index[key]
+                    self._fill_missing(existing, visit, skip=("visit_id",))
+                else:
+                    existing = copy.deepcopy(visit)
+                    existing["visit_id"] = len(merged["visit"]) + 1
+                    merged["visit"].append(existing)
+                    if key is not None:
+                        visit_index[key] = existing
+                # A visit without an id cannot be referenced; records without a visit_id stay unattached
+                if visit.get("visit_id") is not None:
+                    visit_id_map[visit["visit_id"]] = existing["visit_id"]
+
+            for section, key_fields in SECTION_KEYS.items():
+                for record in partial.get(section) or []:
+                    if not isinstance(record, dict):
+                        continue
+                    record = copy.deepcopy(record)
+                    record["visit_id"] = visit_id_map.get(record.get("visit_id"))
+
+                    key = self._record_key(record, key_fields)
+                    if key is not None:
+                        key = (record["visit_id"],) + key
+                        existing = next((entry for entry in record_index[section].get(key, ())
+                                         if partial_index not in entry[1]), None)
+                        if existing is not None:
+                            self._fill_missing(existing[0], record)
+                            existing[1].add(partial_index)
+                            continue
+                        record_index[section].setdefault(key, []).append((record, {partial_index}))
+
+                    merged.setdefault(section, []).append(record)
+
+        for visit in merged["visit"]:
+            if isinstance(visit.get("visit_notes"), dict):
+                visit["visit_notes"]["visit_id"] = visit["visit_id"]
+
+        if not merged["patient"]:
+            merged.pop("patient")
+        for section in SECTION_KEYS:
+            merged.setdefault(section, [])
+
+        self._unify_providers(merged)
+        return merged
+
+    def _unify_providers(self, data: dict) -> None:
+        """Collapses nested provider objects that refer to the same person so they resolve to one provider row"""
+        canonical = {}
+        nested = []
+
+        def collect(obj):
+            for key, value in obj.items():
+                if isinstance(value, dict) and ("provider_name" in value or "npi_number" in value):
+                    provider_key = self._provider_key(value)
+                    if provider_key is None:
+                        continue
+                    if provider_key in canonical:
+                        self._fill_missing(canonical[provider_key], value)
+                    else:
+                        canonical[provider_key] = copy.deepcopy(value)
+                    nested.append((obj, key, provider_key))
+                elif isinstance(value, dict):
+                    collect(value)
+
+        for section, records in data.items():
+            for record in records if isinstance(records, list) else [records]:
+                if isinstance(record, dict):
+                    collect(record)
+
+        for obj, key, provider_key in nested:
+            obj[key] = copy.deepcopy(canonical[provider_key])
+
+    def _provider_key(self, provider: dict):
+        if provider.get("npi_number"):
+            return ("npi", self._normalize(provider["npi_number"]))
+        if provider.get("provider_name"):
+            return ("name", self._normalize(provider["provider_name"]))
+        return None
+
+    def _record_key(self, record: dict, key_fields: tuple):
+        key = tuple(self._normalize(record.get(field)) for field in key_fields)
+        if all(value is None for value in key):
+            return None
+        return key
+
+    def _normalize(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = re.sub(r"\s+", " ", value).strip().lower()
+            return value or None
+        return value
+
+    def _fill_missing(self, target: dict, source: dict, skip: tuple = ()) -> None:
+        """Copies fields from source into target where target has no value, recursing into nested objects"""
+        for key, value in source.items():
+            if key in skip:
+                continue
+            if target.get(key) is None and value is not None:
+                target[key] = copy.deepcopy(value)
+            elif isinstance(target.get(key), dict) and isinstance(value, dict):
+                self._fill_missing(target[key], value)
@@ -1,16 +1,31 @@
 # Generates JSON template from JSON schema for use in LLM prompt
 
 from langchain.prompts import PromptTemplate
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, create_model
 
 from schemas.json_schemas import *
 
-from typing import get_args, get_origin, Union
+from typing import get_args, get_origin, Optional, Union
+import threading
+import hashlib
 import inspect
+import copy
 import json
+import os
+
+# Stands in for the patient id in cached templates; the real id is passed to the prompt as a variable
+PATIENT_ID_PLACEHOLDER = "<patient_id>"
+
+# Built templates per schema set, shared by every JSONPromptGen in the process
+_template_cache = {}
+_template_lock = threading.Lock()
 
 
 class JSONPromptGen:
+    def __init__(self, cache_dir: str = None):
+        """cache_dir: optional directory where built templates are stored, keyed by a hash of the model definitions"""
+        self.cache_dir = cache_dir
+
     def get_prompt_template(self, model: type[BaseModel], patient_id: int) -> dict:
         def resolve_type(field_type):
             """Get base type, resolving Optional, Union, etc."""
@@ -75,13 +90,170 @@ class JSONPromptGen:
 
         return build_fields(model)
 
-    def generate_json_prompt(self, schemas_with_flags: dict[type[BaseModel], bool], patient_id: int):
+    def generate_json_prompt(self, schemas_with_flags: dict[type[BaseModel], bool], patient_id: int = None):
+        """
+        Returns the JSON template for the schemas. The template is built once per schema set with
+        PATIENT_ID_PLACEHOLDER for patient_id; passing patient_id returns a copy with the id embedded.
+        """
+        json_prompt_template = copy.deepcopy(self._get_cached_template(schemas_with_flags)["template"])
+        if patient_id is None:
+            return json_prompt_template
+        return self._fill_patient_id(json_prompt_template, patient_id)
+
+    def get_json_prompt_text(self, schemas_with_flags: dict[type[BaseModel], bool], sections=None) -> str:
+        """
+        Serialized template, byte-identical for every document so prompt prefixes can be cached by the provider.
+        sections: optional iterable of section keys (e.g. from utils.section_selector.SectionSelector) to keep.
+        """
+        return self._get_rendered_text(schemas_with_flags, "json", sections)
+
+    def get_compact_prompt_text(self, schemas_with_flags: dict[type[BaseModel], bool], sections=None) -> str:
+        """
+        TypeScript-like field list for the same template ("name?: type" per field, "[{...}]" for list sections),
+        a fraction of the tokens of the JSON template. sections works as in get_json_prompt_text.
+        """
+        return self._get_rendered_text(schemas_with_flags, "compact", sections)
+
+    def get_prompt_text(self, schemas_with_flags: dict[type[BaseModel], bool], prompt_format: str = "json", sections=None) -> str:
+        """Dispatch on prompt_format ("json" or "compact")"""
+        if prompt_format == "compact":
+            return self.get_compact_prompt_text(schemas_with_flags, sections)
+        if prompt_format == "json":
+            return self.get_json_prompt_text(schemas_with_flags, sections)
+        raise ValueError(f"Unknown prompt_format: {prompt_format}")
+
+    def get_output_model(self, schemas_with_flags: dict[type[BaseModel], bool]) -> type[BaseModel]:
+        """
+        Pydantic model of a whole extraction result (one field per section, keyed like the JSON template),
+        for LLM clients that constrain their output to a schema (LangChain with_structured_output)
+        """
+        cached = self._get_cached_template(schemas_with_flags)
+        with _template_lock:
+            if "output_model" not in cached:
+                fields = {}
+                for schema, wrap_in_list in schemas_with_flags.items():
+                    if wrap_in_list:
+                        fields[schema.__name__.lower()] = (list[schema], Field(default_factory=list))
+                    else:
+                        fields[schema.__name__.lower()] = (Optional[schema], None)
+                cached["output_model"] = create_model("ExtractionResult", **fields)
+            return cached["output_model"]
+
+    def schema_hash(self, schemas_with_flags: dict[type[BaseModel], bool]) -> str:
+        """Hash of the model definitions (field names, types, constraints) and list flags"""
+        return self._get_cached_template(schemas_with_flags)["hash"]
+
+    def _get_cached_template(self, schemas_with_flags: dict[type[BaseModel], bool]) -> dict:
+        memo_key = tuple(schemas_with_flags.items())
+        with _template_lock:
+            if memo_key in _template_cache:
+                return _template_cache[memo_key]
+
+            definitions = json.dumps(
+                [[schema.__name__, wrap_in_list, schema.model_json_schema()] for schema, wrap_in_list in memo_key],
+                sort_keys=True, default=str
+            )
+            schema_hash = hashlib.sha256(definitions.encode("utf-8")).hexdigest()
+
+            template = self._load_template(schema_hash)
+            if template is None:
+                template = self._build_template(schemas_with_flags)
+                self._store_template(schema_hash, template)
+
+            _template_cache[memo_key] = {
+                "template": template,
+                "text": json.dumps(template),
+                "hash": schema_hash,
+                "rendered": {}
+            }
+            return _template_cache[memo_key]
+
+    def _get_rendered_text(self, schemas_with_flags: dict[type[BaseModel], bool], prompt_format: str, sections=None) -> str:
+        """Render (and memoize) the template in prompt_format, restricted to sections when given"""
+        cached = self._get_cached_template(schemas_with_flags)
+        if sections is None and prompt_format == "json":
+            return cached["text"]
+
+        render_key = (prompt_format, frozenset(sections) if sections is not None else None)
+        with _template_lock:
+            if render_key not in cached["rendered"]:
+                template = cached["template"]
+                if sections is not None:
+                    template = {key: value for key, value in template.items() if key in render_key[1]}
+                if prompt_format == "compact":
+                    cached["rendered"][render_key] = self._render_compact(template)
+                else:
+                    cached["rendered"][render_key] = json.dumps(template)
+            return cached["rendered"][render_key]
+
+    def _build_template(self, schemas_with_flags: dict[type[BaseModel], bool]) -> dict:
         json_prompt_template = {}
         for schema, wrap_in_list in schemas_with_flags.items():
             key = schema.__name__.lower()
-            prompt = self.get_prompt_template(schema, patient_id)
+            prompt = self.get_prompt_template(schema, PATIENT_ID_PLACEHOLDER)
             if wrap_in_list:
                 json_prompt_template[key] = [prompt]
             else:
                 json_prompt_template[key] = prompt
         return json_prompt_template
+
+    def _template_path(self, schema_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"json_prompt_{schema_hash[:16]}.json")
+
+    def _load_template(self, schema_hash: str):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._template_path(schema_hash), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _store_template(self, schema_hash: str, template: dict) -> None:
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._template_path(schema_hash)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(template, f)
+        os.replace(tmp_path, self._template_path(schema_hash))
+
+    def _fill_patient_id(self, obj, patient_id):
+        if isinstance(obj, dict):
+            return {k: self._fill_patient_id(v, patient_id) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._fill_patient_id(v, patient_id) for v in obj]
+        return patient_id if obj == PATIENT_ID_PLACEHOLDER else obj
+
+    def _render_compact(self, template: dict) -> str:
+        lines = ["// name?: optional field, [{...}]: list of records"]
+        for key, value in template.items():
+            if isinstance(value, list):
+                lines.append(f"{key}: [{self._compact_fields(value[0])}]")
+            else:
+                lines.append(f"{key}: {self._compact_fields(value)}")
+        return "\n".join(lines)
+
+    def _compact_fields(self, fields: dict) -> str:
+        parts = []
+        for name, entry in fields.items():
+            if entry == PATIENT_ID_PLACEHOLDER:
+                parts.append(f"{name}: int")
+            elif isinstance(entry, dict) and entry.get("type") == "list" and "items" in entry:
+                items = entry["items"]
+                if self._is_leaf(items):
+                    parts.append(f"{name}: {self._compact_type(items['type'])}[]")
+                else:
+                    parts.append(f"{name}: [{self._compact_fields(items)}]")
+            elif self._is_leaf(entry):
+                parts.append(f"{name}{'?' if entry['optional'] else ''}: {self._compact_type(entry['type'])}")
+            else:
+                parts.append(f"{name}: {self._compact_fields(entry)}")
+        return "{" + "; ".join(parts) + "}"
+
+    def _is_leaf(self, entry) -> bool:
+        return isinstance(entry, dict) and set(entry) == {"type", "optional"}
+
+    def _compact_type(self, type_string: str) -> str:
+        # "datetime (YYYY-MM-DDTHH:MM:SS)" -> "datetime"; the prompt already spells out the date format
+        return type_string.split(" ", 1)[0]
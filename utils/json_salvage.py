@@ -0,0 +1,121 @@
+# Incremental JSON parser that recovers the complete sections of a truncated or noisy LLM response
+
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+def _object_starts(text: str):
+    """Positions of '{' that open an object with a string key (or an empty object)"""
+    pos = text.find("{")
+    while pos != -1:
+        following = _skip_whitespace(text, pos + 1)
+        if following >= len(text) or text[following] in "\"}":
+            yield pos
+        pos = text.find("{", pos + 1)
+
+def _object_end(text: str, start: int) -> int:
+    """Position just past the brace closing the object at start (len(text) when it is never closed), skipping strings"""
+    depth, in_string, escaped = 0, False, False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return len(text)
+
+def _salvage_list(text: str, pos: int) -> list:
+    """Complete items of a list that is cut off part way through"""
+    items = []
+    pos = _skip_whitespace(text, pos + 1)
+    while pos < len(text) and text[pos] != "]":
+        try:
+            item, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+        pos = _skip_whitespace(text, pos)
+        if pos < len(text) and text[pos] == ",":
+            pos = _skip_whitespace(text, pos + 1)
+        else:
+            break
+    return items
+
+def _salvage_object(text: str, start: int) -> dict:
+    """Parse key/value pairs from the object at start until the text stops being valid JSON"""
+    result = {}
+    pos = _skip_whitespace(text, start + 1)
+    while pos < len(text) and text[pos] != "}":
+        try:
+            key, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return result
+        pos = _skip_whitespace(text, pos)
+        if not isinstance(key, str) or pos >= len(text) or text[pos] != ":":
+            return result
+        pos = _skip_whitespace(text, pos + 1)
+
+        try:
+            value, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            # Keep the finished records of a list section that was cut off
+            if pos < len(text) and text[pos] == "[":
+                items = _salvage_list(text, pos)
+                if items:
+                    result[key] = items
+            return result
+        result[key] = value
+
+        pos = _skip_whitespace(text, pos)
+        if pos < len(text) and text[pos] == ",":
+            pos = _skip_whitespace(text, pos + 1)
+        elif pos >= len(text) or text[pos] != "}":
+            return result
+    return result
+
+def salvage_json(text: str) -> dict:
+    """
+    Returns the JSON object in text (an LLM response possibly wrapped in prose or code fences). When the
+    object is truncated or malformed, every section parsed before the damage is kept, including the complete
+    records of a list that was cut off. Only top-level objects are candidates: a record nested in an object
+    that salvages nothing is never returned in its place. Raises ValueError when no section can be recovered.
+    """
+    return salvage_json_status(text)[0]
+
+def salvage_json_status(text: str) -> tuple[dict, bool]:
+    """salvage_json plus whether the object was complete (False when sections had to be salvaged)"""
+    end = 0
+    for start in _object_starts(text):
+        if start < end:
+            continue
+        try:
+            obj, _ = _decoder.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj, True
+        except json.JSONDecodeError:
+            pass
+
+        salvaged = _salvage_object(text, start)
+        if salvaged:
+            print(f"Salvaged {len(salvaged)} section(s) from an incomplete JSON response: {list(salvaged)}")
+            return salvaged, False
+        end = _object_end(text, start)
+
+    raise ValueError("No JSON object found in model output")
@@ -1,7 +1,29 @@
 # Validates JSON object using Pydantic schema 
 
 from typing import List, Type, Dict, Any
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+import threading
+
+# Compiled validators, shared by every JSONValidator in the process
+_section_adapters = {}
+_document_models = {}
+_adapter_lock = threading.Lock()
+
+def get_section_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter(list[schema]), compiled once per model"""
+    with _adapter_lock:
+        if schema not in _section_adapters:
+            _section_adapters[schema] = TypeAdapter(List[schema])
+        return _section_adapters[schema]
+
+def get_document_model(schemas: Dict[str, Type[BaseModel]]) -> Type[BaseModel]:
+    """Model with one list field per section, compiled once per schema mapping, for validating raw JSON in one pass"""
+    key = tuple(schemas.items())
+    with _adapter_lock:
+        if key not in _document_models:
+            fields = {section_key: (List[schema], Field(default_factory=list)) for section_key, schema in key}
+            _document_models[key] = create_model("SectionsDocument", **fields)
+        return _document_models[key]
 
 class JSONValidator:
     def validate_json_sections(
@@ -23,8 +45,8 @@ class JSONValidator:
 
             for idx, item in enumerate(items):
                 try:
-                    validated = schema.parse_obj(item)
-                    results[section_key]["valid"].append(validated.dict())
+                    validated = schema.model_validate(item)
+                    results[section_key]["valid"].append(validated.model_dump())
                 except ValidationError as ve:
                     results[section_key]["errors"].append({
                         "index": idx,
@@ -34,3 +56,95 @@ class JSONValidator:
                     all_valid = False
 
         return all_valid, results
+
+    def validate_sections(
+        self,
+        schemas: Dict[str, Type[BaseModel]],
+        data: Dict[str, Any] | bytes | str
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fast path: each section is validated as a whole by a cached TypeAdapter(list[Model]); raw JSON
+        (bytes/str) is validated in a single validate_json pass without building intermediate dicts.
+        Returns only the failures, {section_key: [{"index": idx, "errors": [...]}, ...]}, where index is
+        None when the section itself is malformed (e.g. not a list). An empty dict means everything is valid.
+        """
+        if isinstance(data, (bytes, str)):
+            try:
+                get_document_model(schemas).model_validate_json(data)
+                return {}
+            except ValidationError as ve:
+                return self._group_errors(ve.errors(include_url=False))
+
+        failures = {}
+        for section_key, schema in schemas.items():
+            try:
+                get_section_adapter(schema).validate_python(data.get(section_key) or [])
+            except ValidationError as ve:
+                errors = [dict(error, loc=(section_key, *error["loc"])) for error in ve.errors(include_url=False)]
+                failures.update(self._group_errors(errors))
+        return failures
+
+    def validate_document(
+        self,
+        schemas_with_flags: Dict[Type[BaseModel], bool],
+        data: Dict[str, Any]
+    ) -> tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Validates every section of an extraction once, mapping sections by name (schema.__name__.lower()).
+        List sections go through the cached TypeAdapter(list[Model]) and single-object sections (patient)
+        through the model itself. Returns (validated_data, failures): validated_data holds the type-coerced
+        records as model_dump(exclude_unset=True) dicts ready for persistence, with failing records passed
+        through unchanged, and failures is shaped like validate_sections.
+        """
+        validated = dict(data)
+        failures = {}
+        for schema, wrap_in_list in schemas_with_flags.items():
+            section_key = schema.__name__.lower()
+            items = data.get(section_key)
+            if items is None:
+                continue
+
+            if not wrap_in_list:
+                try:
+                    validated[section_key] = schema.model_validate(items).model_dump(exclude_unset=True)
+                except ValidationError as ve:
+                    failures[section_key] = [{"index": None, "errors": ve.errors(include_url=False)}]
+                continue
+
+            if not isinstance(items, list):
+                failures[section_key] = [{
+                    "index": None,
+                    "errors": f"Expected a list of objects for section '{section_key}', got {type(items)}"
+                }]
+                continue
+
+            adapter = get_section_adapter(schema)
+            try:
+                validated[section_key] = [model.model_dump(exclude_unset=True) for model in adapter.validate_python(items)]
+                continue
+            except ValidationError as ve:
+                errors = [dict(error, loc=(section_key, *error["loc"])) for error in ve.errors(include_url=False)]
+                failures[section_key] = self._group_errors(errors)[section_key]
+
+            # Keep the coerced form of the records that did validate
+            failed = {failure["index"] for failure in failures[section_key]}
+            valid_indices = [idx for idx in range(len(items)) if idx not in failed]
+            records = list(items)
+            for idx, model in zip(valid_indices, adapter.validate_python([items[idx] for idx in valid_indices])):
+                records[idx] = model.model_dump(exclude_unset=True)
+            validated[section_key] = records
+
+        return validated, failures
+
+    def _group_errors(self, errors: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group pydantic errors located at (section, index, field...) by section and record index"""
+        failures = {}
+        for error in errors:
+            section_key, loc = error["loc"][0], error["loc"][1:]
+            index = loc[0] if loc and isinstance(loc[0], int) else None
+            record_errors = failures.setdefault(section_key, {})
+            record_errors.setdefault(index, []).append(dict(error, loc=loc[1:] if index is not None else loc))
+        return {
+            section_key: [{"index": index, "errors": errors} for index, errors in record_errors.items()]
+            for section_key, record_errors in failures.items()
+        }
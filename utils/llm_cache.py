@@ -0,0 +1,93 @@
+# Persistent SQLite cache for LLM responses
+
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+
+class LLMResponseCache:
+    def __init__(self, db_path: str, ttl_seconds: float | None = None, max_entries: int | None = 100000):
+        """
+        Responses are keyed by a hash of every prompt input (see make_key). Entries older than
+        ttl_seconds are ignored and removed; past max_entries the least recently used are evicted.
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_access ON llm_responses (last_access)")
+
+    @staticmethod
+    def make_key(context: str, prompt_template: str, json_prompt, patient_id, model: str, temperature: float) -> str:
+        payload = json.dumps({
+            "context": context,
+            "prompt_template": prompt_template,
+            "json_prompt": json_prompt,
+            "patient_id": patient_id,
+            "model": model,
+            "temperature": temperature
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_responses WHERE cache_key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            with self._conn:
+                self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE cache_key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (cache_key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            if self.max_entries is not None:
+                self._conn.execute("""
+                    DELETE FROM llm_responses WHERE cache_key IN (
+                        SELECT cache_key FROM llm_responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+# Lightweight pipeline instrumentation: stage timers, counters, DB round trips; exported as a JSON report or Prometheus text
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from sqlalchemy import event
+import threading
+import json
+import time
+import re
+import os
+
+# Samples kept per stage for percentiles (totals and counts are exact)
+MAX_SAMPLES = 10000
+
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+[`\"]?(\w+)", re.IGNORECASE)
+_NULL_CONTEXT = nullcontext()
+
+class Metrics:
+    def __init__(self, enabled: bool = False, prefix: str = "pipeline"):
+        """Every method is a no-op while enabled is False, so instrumented code pays one attribute check"""
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._instrumented_engines = set()
+        self._server = None
+
+    def stage(self, name: str):
+        """Context manager timing one run of a pipeline stage"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self._stages.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "samples": deque(maxlen=MAX_SAMPLES)})
+            stage["count"] += 1
+            stage["total"] += seconds
+            stage["max"] = max(stage["max"], seconds)
+            stage["samples"].append(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def instrument_engine(self, engine) -> None:
+        """Count DB round trips (one per cursor execute, executemany included) and inserted rows per table"""
+        if not self.enabled or engine in self._instrumented_engines:
+            return
+        self._instrumented_engines.add(engine)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_round_trip(conn, cursor, statement, parameters, context, executemany):
+            if not self.enabled:
+                return
+            self.inc("db_round_trips")
+            match = _INSERT_TABLE.match(statement)
+            if match:
+                rows = len(parameters) if executemany and parameters else 1
+                self.inc("db_rows_inserted", rows, table=match.group(1))
+
+    def report(self) -> dict:
+        """JSON-serializable snapshot: per-stage count/total/percentiles (seconds), counters, and derived cache hit rates"""
+        with self._lock:
+            stages = {}
+            for name, stage in self._stages.items():
+                ordered = sorted(stage["samples"])
+                stages[name] = {
+                    "count": stage["count"],
+                    "total_seconds": round(stage["total"], 4),
+                    "mean_seconds": round(stage["total"] / stage["count"], 4),
+                    "p50_seconds": round(self._percentile(ordered, 50), 4),
+                    "p95_seconds": round(self._percentile(ordered, 95), 4),
+                    "max_seconds": round(stage["max"], 4)
+                }
+            counters = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                if labels:
+                    counters.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+                else:
+                    counters[name] = value
+
+        hit_rates = {}
+        for cache in ("llm_cache", "scrape_cache", "provider_cache"):
+            hits, misses = counters.get(f"{cache}_hits", 0), counters.get(f"{cache}_misses", 0)
+            if hits + misses:
+                hit_rates[cache] = round(hits / (hits + misses), 4)
+        return {"stages": stages, "counters": counters, "cache_hit_rates": hit_rates}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (stages as summaries, counters as *_total)"""
+        lines = []
+        with self._lock:
+            if self._stages:
+                metric = f"{self.prefix}_stage_seconds"
+                lines.append(f"# TYPE {metric} summary")
+                for name, stage in sorted(self._stages.items()):
+                    ordered = sorted(stage["samples"])
+                    for quantile in (0.5, 0.95):
+                        lines.append(f'{metric}{{stage="{name}",quantile="{quantile}"}} {self._percentile(ordered, quantile * 100):.6f}')
+                    lines.append(f'{metric}_sum{{stage="{name}"}} {stage["total"]:.6f}')
+                    lines.append(f'{metric}_count{{stage="{name}"}} {stage["count"]}')
+
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} counter")
+                    declared.add(metric)
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+                lines.append(f"{metric}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str) -> None:
+        self._write(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """Write the text format atomically, e.g. for node_exporter's textfile collector"""
+        self._write(path, self.to_prometheus())
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /report (JSON) from a background thread"""
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/report"):
+                    body, content_type = json.dumps(metrics.report(), indent=2), "application/json"
+                else:
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.end_headers()
+                self.wfile.write(body.encode("utf-8"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def _write(self, path: str, text: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _percentile(ordered: list, point: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(point / 100 * len(ordered)))]
+
+# Process-wide metrics used by every instrumented module; disabled until configure_metrics(enabled=True)
+metrics = Metrics()
+
+def configure_metrics(enabled: bool = True) -> Metrics:
+    metrics.enabled = enabled
+    return metrics
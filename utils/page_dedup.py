@@ -0,0 +1,157 @@
+# Collapses repeated pages (MinHash over word shingles) and repeated paragraphs (normalized hash) of a scraped document before extraction
+
+from tools.chunk_router import LAYOUT_NOISE, PAGE_BREAK
+from utils.section_selector import SectionSelector
+from utils.metrics import metrics
+import hashlib
+import random
+import re
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NON_WORD = re.compile(r"[^\w]+")
+
+class PageDeduplicator:
+    def __init__(self, threshold: float = 0.9, shingle_size: int = 5, num_perm: int = 64, bands: int = 16,
+                 min_paragraph_chars: int = 80, header_lines: int = 3, selector: SectionSelector = None):
+        """
+        threshold: estimated Jaccard similarity of two pages' word shingles above which the later page is a duplicate.
+        num_perm / bands: MinHash signature length and LSH bands used to find candidate pages without comparing every pair.
+        min_paragraph_chars: shorter paragraphs (headings, field labels) are never collapsed.
+        header_lines: first lines of a near-duplicate page that are always kept (its visit/date header).
+        selector: paragraphs and lines with its clinical cue words (SectionSelector by default) are never collapsed,
+        since the same vitals or medication at a later visit is a record of that visit.
+        A deduplicator holds the pages seen so far, so use one instance per document.
+        """
+        self.threshold = threshold
+        self.header_lines = header_lines
+        self.selector = selector or SectionSelector()
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_paragraph_chars = min_paragraph_chars
+        rng = random.Random(0)
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+        self.pages = []            # kept pages: {"page", "markdown", "source_pages"}
+        self.duplicate_pages = {}  # repeated page -> earlier page it repeats (fully dropped, or reduced to its new lines)
+        self.duplicate_paragraphs = {}  # page of a paragraph's first occurrence -> pages where its repeats were dropped
+        self._signatures = {}  # indexed page position -> MinHash signature
+        self._lines = {}       # indexed page position -> normalized lines
+        self._buckets = {}
+        self._page_hashes = {}
+        self._paragraphs = {}
+        self._chars = [0, 0]
+
+    def dedupe_text(self, text: str) -> str:
+        """Deduplicate a whole scraped document (pages split on LandingAI's page breaks) and return the remaining markdown"""
+        for number, markdown in enumerate(PAGE_BREAK.split(text), start=1):
+            self.add_page({"page": number, "markdown": markdown})
+        return "\n\n<!-- PAGE BREAK -->\n\n".join(page["markdown"] for page in self.pages)
+
+    def iter_pages(self, pages):
+        """Deduplicate a page stream ({"page", "markdown"}, e.g. PDFScraper.iter_pages_landingai), yielding only kept pages"""
+        for page in pages:
+            kept = self.add_page(page)
+            if kept is not None:
+                yield kept
+
+    def add_page(self, page: dict):
+        """
+        Returns the page to extract, or None when it repeats an earlier page exactly. A near-duplicate page is reduced
+        to its header lines, clinical lines and the lines the earlier page does not have; a new page loses the
+        non-clinical paragraphs already seen (on earlier pages or further up the same page).
+        """
+        markdown = page["markdown"]
+        self._chars[0] += len(markdown)
+        normalized = self.normalize(markdown)
+        page_hash = self._hash(normalized)
+
+        if page_hash in self._page_hashes:
+            return self._drop_page(page, self.pages[self._page_hashes[page_hash]])
+
+        signature = self._signature(normalized)
+        index = self._near_duplicate(signature)
+        if index is not None:
+            lines = [line for line in markdown.splitlines() if self.normalize(line)]
+            if not any(self.normalize(line) not in self._lines[index] for line in lines):
+                return self._drop_page(page, self.pages[index])
+            kept_lines = [line for position, line in enumerate(lines)
+                          if position < self.header_lines or self.normalize(line) not in self._lines[index]
+                          or self.selector.count_cues(line)]
+            self.duplicate_pages[page["page"]] = self.pages[index]["page"]
+            metrics.inc("pages_deduplicated")
+            return self._keep(dict(page, markdown="\n".join(kept_lines), source_pages=[page["page"]]))
+
+        paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", markdown):
+            key = self.normalize(paragraph)
+            if len(key) >= self.min_paragraph_chars and not self.selector.count_cues(paragraph):
+                paragraph_hash = self._hash(key)
+                if paragraph_hash in self._paragraphs:
+                    sources = self.duplicate_paragraphs.setdefault(self._paragraphs[paragraph_hash], [])
+                    if page["page"] not in sources:
+                        sources.append(page["page"])
+                    metrics.inc("paragraphs_deduplicated")
+                    continue
+                self._paragraphs[paragraph_hash] = page["page"]
+            paragraphs.append(paragraph)
+
+        # Only whole new pages are indexed for later comparisons, with the lines of their full text
+        self._page_hashes[page_hash] = len(self.pages)
+        self._signatures[len(self.pages)] = signature
+        self._lines[len(self.pages)] = {self.normalize(line) for line in markdown.splitlines()}
+        for band in range(self.bands):
+            self._buckets.setdefault((band, signature[band * self.rows:(band + 1) * self.rows]), []).append(len(self.pages))
+        return self._keep(dict(page, markdown="\n\n".join(paragraphs), source_pages=[page["page"]]))
+
+    def _keep(self, kept: dict) -> dict:
+        self.pages.append(kept)
+        self._chars[1] += len(kept["markdown"])
+        return kept
+
+    def _drop_page(self, page: dict, original: dict):
+        original["source_pages"].append(page["page"])
+        self.duplicate_pages[page["page"]] = original["page"]
+        metrics.inc("pages_deduplicated")
+        return None
+
+    def provenance(self) -> dict:
+        """
+        JSON-serializable map back to the source pages: every kept page with the pages it stands for
+        (itself plus its exact/near duplicates), dropped pages, and pages whose repeated paragraphs were dropped
+        """
+        return {
+            "pages": {page["page"]: page["source_pages"] for page in self.pages},
+            "duplicate_pages": self.duplicate_pages,
+            "duplicate_paragraphs": self.duplicate_paragraphs,
+            "chars_before": self._chars[0],
+            "chars_after": self._chars[1]
+        }
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercased words without layout markup, punctuation or whitespace differences (OCR spacing, reflowed lines)"""
+        for pattern in LAYOUT_NOISE:
+            text = pattern.sub(" ", text)
+        return _NON_WORD.sub(" ", text.lower()).strip()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _signature(self, normalized: str) -> tuple:
+        words = normalized.split()
+        shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(max(1, len(words) - self.shingle_size + 1))}
+        values = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles]
+        return tuple(min((a * value + b) % _MERSENNE_PRIME for value in values) for a, b in self._permutations)
+
+    def _near_duplicate(self, signature: tuple):
+        """Index of the earliest indexed page sharing an LSH band with signature whose estimated similarity reaches the threshold"""
+        candidates = set()
+        for band in range(self.bands):
+            candidates.update(self._buckets.get((band, signature[band * self.rows:(band + 1) * self.rows]), ()))
+        for index in sorted(candidates):
+            other = self._signatures[index]
+            if sum(x == y for x, y in zip(signature, other)) / len(signature) >= self.threshold:
+                return index
+        return None
@@ -0,0 +1,194 @@
+# In-memory provider/department identity index: NPI first, then normalized and fuzzy names, shared by every batch worker
+
+from utils.json_formatter import ProviderDepartmentCache
+from schemas.sql_schema import Provider, Department
+from sqlalchemy import select
+from utils.metrics import metrics
+from difflib import SequenceMatcher
+import unicodedata
+import re
+
+# Titles, credentials and suffixes that are not part of a person's name
+NAME_NOISE = {
+    "dr", "doctor", "md", "do", "mbbs", "phd", "pharmd", "dds", "dmd", "dpm", "od", "np", "fnp", "aprn", "dnp", "pa",
+    "pac", "rn", "lpn", "crna", "facp", "facc", "facs", "mr", "mrs", "ms", "miss", "jr", "sr", "ii", "iii", "iv"
+}
+
+def name_tokens(name) -> tuple:
+    """Sorted name words without accents, initials, titles or credentials: "Dr. John Smith MD" and "SMITH, JOHN" both give ("john", "smith")"""
+    if not name:
+        return ()
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    return tuple(sorted({token for token in re.findall(r"[a-z]+", text) if len(token) > 1 and token not in NAME_NOISE}))
+
+def name_parts(name):
+    """
+    (surname, given names and initials) without accents, titles or credentials: "Dr. John A. Smith MD" and
+    "SMITH, JOHN A" both give ("smith", ("john", "a")). The surname is the part before a comma, else the last word.
+    """
+    if not name:
+        return None
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    pieces = [[re.sub(r"['-]", "", word) for word in re.findall(r"[a-z]+(?:['-][a-z]+)*", piece) if word not in NAME_NOISE]
+              for piece in text.split(",")]
+    pieces = [piece for piece in pieces if piece]
+    if not pieces:
+        return None
+    if len(pieces) > 1:
+        return " ".join(pieces[0]), tuple(word for piece in pieces[1:] for word in piece)
+    words = pieces[0]
+    last = next((index for index in reversed(range(len(words))) if len(words[index]) > 1), len(words) - 1)
+    return words[last], tuple(words[:last] + words[last + 1:])
+
+def normalize_npi(npi):
+    digits = re.sub(r"\D", "", str(npi)) if npi is not None else ""
+    return digits or None
+
+def normalize_text(value):
+    if value is None:
+        return None
+    return " ".join(re.findall(r"[a-z0-9]+", str(value).lower())) or None
+
+class ProviderIndex(ProviderDepartmentCache):
+    def __init__(self, engine=None, threshold: float = 0.9, department_threshold: float = 0.95):
+        """
+        Drop-in replacement for ProviderDepartmentCache (same get_/put_ interface used by the bulk resolver).
+        Besides exact keys it matches providers by NPI, then by normalized name tokens, then within the same
+        surname: given names that agree up to initials ("J. Smith", "Dr. Smith") or differ by OCR-style errors
+        (difflib ratio of the given names >= threshold, which already rejects one edit in names under ten letters,
+        e.g. Jon/John). Surnames must match exactly and a variant matching several providers matches none.
+        Departments match by normalized/fuzzy name (ratio >= department_threshold, stricter because specialties
+        differ by a few letters, e.g. nephrology/neurology) within the same system.
+        Every existing provider and department is loaded from engine here, before batch workers start (loading lazily
+        from a worker could wait on another worker's write lock while that worker waits on this index); rows inserted
+        later are added through put_providers/put_departments once their transaction commits.
+        """
+        super().__init__()
+        self.threshold = threshold
+        self.department_threshold = department_threshold
+        self._providers = {}        # provider id -> (name tokens, npi, normalized specialty, name parts)
+        self._by_npi = {}
+        self._by_name = {}          # name tokens -> provider ids
+        self._by_surname = {}       # surname -> provider ids (candidates for initials/OCR variants)
+        self._departments = {}      # department id -> (normalized name, normalized type, normalized system)
+        self._departments_by_system = {}
+        if engine is not None:
+            self.load(engine)
+
+    def load(self, engine) -> None:
+        with engine.connect() as conn:
+            departments = conn.execute(select(Department.id, Department.department_name, Department.department_type,
+                                              Department.system_name).order_by(Department.id)).all()
+            providers = conn.execute(select(Provider.id, Provider.provider_name, Provider.npi_number,
+                                            Provider.specialty).order_by(Provider.id)).all()
+        with self._lock:
+            for row in departments:
+                self._add_department(row[0], row[1:])
+            for row in providers:
+                self._add_provider(row[0], row.provider_name, row.npi_number, row.specialty)
+        metrics.inc("provider_index_loaded_rows", len(providers) + len(departments))
+
+    def get_departments(self, keys):
+        return self._get(keys, self.departments, self._match_department)
+
+    def get_providers(self, keys):
+        return self._get(keys, self.providers, self._match_provider)
+
+    def put_departments(self, id_map):
+        with self._lock:
+            self.departments.update(id_map)
+            for key, department_id in id_map.items():
+                self._add_department(department_id, key)
+
+    def put_providers(self, id_map):
+        with self._lock:
+            self.providers.update(id_map)
+            for (name, npi, specialty, _, _), provider_id in id_map.items():
+                self._add_provider(provider_id, name, npi, specialty)
+
+    def _get(self, keys, exact: dict, match):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in exact:
+                    found[key] = exact[key]
+                    continue
+                matched = match(key)
+                if matched is not None:
+                    # Remember the variant so the next lookup is a plain dict hit
+                    exact[key] = found[key] = matched
+        self._count_lookups(keys, found)
+        return found
+
+    def _match_provider(self, key):
+        name, npi, specialty, _, _ = key
+        npi = normalize_npi(npi)
+        if npi and npi in self._by_npi:
+            return self._by_npi[npi]
+
+        tokens, parts = name_tokens(name), name_parts(name)
+        if not tokens or parts is None:
+            return None
+        specialty = normalize_text(specialty)
+
+        def compatible(provider_id):
+            # Different NPIs or different specialties mean different people, whatever the name
+            _, other_npi, other_specialty, _ = self._providers[provider_id]
+            return not (npi and other_npi and npi != other_npi) and not (specialty and other_specialty and specialty != other_specialty)
+
+        exact = [provider_id for provider_id in self._by_name.get(tokens, ()) if compatible(provider_id)]
+        if exact:
+            return min(exact)
+
+        surname, given = parts
+        candidates = [provider_id for provider_id in self._by_surname.get(surname, ()) if compatible(provider_id)]
+        # "Dr. Smith" is John Smith only when he is the single compatible Smith
+        matches = [provider_id for provider_id in candidates if self._given_names_match(given, self._providers[provider_id][3][1])]
+        if len(matches) == 1:
+            metrics.inc("provider_index_fuzzy_matches")
+            return matches[0]
+        return None
+
+    def _given_names_match(self, given: tuple, other: tuple) -> bool:
+        """Given names agree name by name (a missing middle name is fine): equal, an initial of the other, or an OCR variant"""
+        for name, other_name in zip(given, other):
+            if name == other_name or (len(name) == 1 or len(other_name) == 1) and name[0] == other_name[0]:
+                continue
+            if len(name) == 1 or len(other_name) == 1 or SequenceMatcher(None, name, other_name).ratio() < self.threshold:
+                return False
+        return True
+
+    def _match_department(self, key):
+        name, department_type, system = (normalize_text(value) for value in key)
+        if name is None:
+            return None
+        best, best_score = None, self.department_threshold
+        for department_id in self._departments_by_system.get(system, ()):
+            other_name, other_type, _ = self._departments[department_id]
+            if department_type and other_type and department_type != other_type:
+                continue
+            score = 1.0 if other_name == name else SequenceMatcher(None, name, other_name or "").ratio()
+            if score > best_score or (score == best_score and (best is None or department_id < best)):
+                best, best_score = department_id, score
+        if best is not None and self._departments[best][0] != name:
+            metrics.inc("provider_index_fuzzy_matches")
+        return best
+
+    def _add_provider(self, provider_id, name, npi, specialty) -> None:
+        if provider_id is None or provider_id in self._providers:
+            return
+        tokens, npi, parts = name_tokens(name), normalize_npi(npi), name_parts(name)
+        self._providers[provider_id] = (tokens, npi, normalize_text(specialty), parts)
+        if npi:
+            self._by_npi.setdefault(npi, provider_id)
+        if tokens:
+            self._by_name.setdefault(tokens, []).append(provider_id)
+        if parts is not None:
+            self._by_surname.setdefault(parts[0], []).append(provider_id)
+
+    def _add_department(self, department_id, key) -> None:
+        if department_id is None or department_id in self._departments:
+            return
+        normalized = tuple(normalize_text(value) for value in key)
+        self._departments[department_id] = normalized
+        self._departments_by_system.setdefault(normalized[2], []).append(department_id)
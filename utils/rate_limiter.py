@@ -0,0 +1,116 @@
+# Async request budgeting and retry helpers for LLM calls
+
+from collections import deque
+import asyncio
+import random
+import threading
+import time
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_MESSAGES = ("429", "resourceexhausted", "resource exhausted", "rate limit", "quota", "503", "unavailable", "500 internal", "deadline exceeded")
+
+class AsyncRateLimiter:
+    def __init__(self, requests_per_minute: int | None = None):
+        """
+        Rolling one minute request budget. Thread-safe and not bound to an event loop, so a single limiter
+        budgets every thread and asyncio.run() loop of the process (e.g. all batch workers of one analyzer).
+        """
+        self.requests_per_minute = requests_per_minute
+        self._slots = deque(maxlen=requests_per_minute or None)  # start times of the latest requests (some may be reserved in the future)
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        """Reserve the next start time that fits the budget and wait for it (no-op when unlimited)"""
+        if not self.requests_per_minute:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = now
+            if len(self._slots) == self.requests_per_minute:
+                slot = max(now, self._slots[0] + 60)
+            self._slots.append(slot)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class AsyncConcurrencyLimiter:
+    def __init__(self, max_concurrency: int | None = None):
+        """
+        Semaphore usable from any thread and event loop (asyncio.Semaphore is bound to one loop): a released
+        slot is handed to the oldest waiter on whichever loop it runs. Use as "async with limiter:".
+        """
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._waiters = deque()  # (loop, future) of requests waiting for a slot
+        self._lock = threading.Lock()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    async def acquire(self) -> None:
+        if not self.max_concurrency:
+            return
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return
+            loop = asyncio.get_running_loop()
+            entry = (loop, loop.create_future())
+            self._waiters.append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = entry in self._waiters
+                if waiting:
+                    self._waiters.remove(entry)
+            if not waiting:
+                # The slot was already handed to this request: pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        if not self.max_concurrency:
+            return
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_wake, waiter)
+                    return
+                except RuntimeError:
+                    continue  # the waiter's loop is closed
+            self._active -= 1
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate limit (429) and server side (5xx) failures"""
+    for attr in ("status_code", "code", "status"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status in RETRYABLE_STATUS_CODES
+    message = f"{type(error).__name__} {error}".lower()
+    return any(token in message for token in RETRYABLE_MESSAGES)
+
+async def retry_with_backoff(request, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+    """
+    Await request() and retry retryable failures with full-jitter exponential backoff.
+    request is a zero-argument callable returning a new awaitable on each attempt.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await request()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            print(f"Retryable LLM error ({e}); retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            attempt += 1
+            await asyncio.sleep(delay)
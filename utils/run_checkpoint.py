@@ -0,0 +1,61 @@
+# Persists per-document stage artifacts so an interrupted pipeline run can resume where it stopped
+
+from utils.document_registry import source_key
+import hashlib
+import json
+import re
+import os
+
+# Pipeline stages in execution order and the artifact each one leaves behind
+STAGE_FILES = {
+    "scrape":    "scraped.md",          # markdown returned by the scraper
+    "dedup":     "dedup.json",          # page provenance of the de-duplicated text (optional stage)
+    "llm":       "llm_raw.json",        # raw JSON string returned by the LLM stage
+    "validated": "validated.json",      # JSON after pydantic validation
+    "resolved":  "resolved.json",       # JSON after patient/provider/department/visit ids are resolved
+    "saved":     "saved.json"           # marker written once every record is persisted
+}
+
+class RunCheckpoint:
+    def __init__(self, runs_root: str, patient_id, pdf_input_filepath: str, resume: bool = False, source_id: str = None):
+        """
+        Artifacts live in <runs_root>/<patient_id>_<pdf name>_<hash of the document's source key>/ (the key
+        DocumentRegistry uses: source_id, else the full path), so same-named files in different folders never
+        share a directory. With resume=True, stages whose artifact already exists are loaded instead of re-run;
+        otherwise artifacts are overwritten.
+        """
+        stem = os.path.splitext(os.path.basename(pdf_input_filepath))[0]
+        key_hash = hashlib.sha256(source_key(pdf_input_filepath, source_id).encode("utf-8")).hexdigest()[:12]
+        self.run_dir = os.path.join(runs_root, re.sub(r"[^\w.-]", "_", f"{patient_id}_{stem}_{key_hash}"))
+        self.resume = resume
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.run_dir, STAGE_FILES[stage])
+
+    def has(self, stage: str) -> bool:
+        """True when resuming and the stage already finished"""
+        return self.resume and os.path.exists(self._path(stage))
+
+    def load(self, stage: str):
+        with open(self._path(stage), "r", encoding="utf-8") as f:
+            if STAGE_FILES[stage].endswith(".md"):
+                return f.read()
+            return json.load(f)
+
+    def save(self, stage: str, data) -> None:
+        """Write the stage artifact atomically so a crash never leaves a partial file behind"""
+        path = self._path(stage)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if STAGE_FILES[stage].endswith(".md"):
+                f.write(data)
+            else:
+                json.dump(data, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+        # Later stages are stale once an earlier stage is re-run
+        stages = list(STAGE_FILES)
+        for later in stages[stages.index(stage) + 1:]:
+            if os.path.exists(self._path(later)):
+                os.remove(self._path(later))
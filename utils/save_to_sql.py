@@ -1,6 +1,7 @@
-# Saves JSON data to SQL tables (other than provider, department, and visit tables)  
+# Saves JSON data to SQL tables (other than provider, department, and visit tables)
 
 from datetime import datetime
+from sqlalchemy import insert, delete, and_
 from sqlalchemy.orm import Session
 from schemas.sql_schema import (
     Provider, Department, Visit, VisitNotes, Diagnosis, Symptom,
@@ -8,27 +9,42 @@ from schemas.sql_schema import (
 )
 
 from sqlalchemy.inspection import inspect
+from utils.json_merger import SECTION_KEYS
+from utils.upsert import complete_row, natural_key_hash, sync_document_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_MAP = {
+    "visitnotes": VisitNotes,
+    "diagnosis": Diagnosis,
+    "symptom": Symptom,
+    "medication": Medication,
+    "vitalsigns": VitalSigns,
+    "labresult": LabResult,
+    "imagingstudy": ImagingStudy,
+    "proceduretreatment": ProcedureTreatment,
+    "provider": Provider,
+    "department": Department
+}
+
+# Mapped column names per model, computed once per process
+_valid_columns = {}
+
+def get_valid_columns(model) -> set:
+    if model not in _valid_columns:
+        _valid_columns[model] = {col.key for col in inspect(model).mapper.column_attrs}
+    return _valid_columns[model]
 
 class SQLSaver:
-    def insert_non_patient_entities(self, session: Session, data: dict) -> None:
+    def insert_non_patient_entities(self, session: Session, data: dict, bulk: bool = False, verbose: bool = False, commit: bool = True) -> None:
         """
         Inserts all non-patient entities into the database.
         Only includes fields that are not None and are defined in the model.
+        bulk=True issues one executemany INSERT per table instead of adding ORM objects one by one.
+        Inserted records are logged at DEBUG (INFO with verbose=True).
         """
-        model_map = {
-            "visitnotes": VisitNotes,
-            "diagnosis": Diagnosis,
-            "symptom": Symptom,
-            "medication": Medication,
-            "vitalsigns": VitalSigns,
-            "labresult": LabResult,
-            "imagingstudy": ImagingStudy,
-            "proceduretreatment": ProcedureTreatment,
-            "provider": Provider,
-            "department": Department
-        }
-
-        for key, model in model_map.items():
+        for key, model in MODEL_MAP.items():
             records = data.get(key)
             if not records:
                 continue
@@ -36,16 +52,58 @@ class SQLSaver:
             if isinstance(records, dict):
                 records = [records]
 
-            valid_columns = {col.key for col in inspect(model).mapper.column_attrs}
+            valid_columns = get_valid_columns(model)
+            rows = [
+                {k: v for k, v in record.items() if k in valid_columns and v is not None}
+                for record in records
+            ]
 
-            for record in records:
-                filtered = {
-                    k: v for k, v in record.items()
-                    if k in valid_columns and v is not None
-                }
+            if bulk:
+                session.execute(insert(model), rows)
+                logger.log(logging.INFO if verbose else logging.DEBUG, "Bulk inserted %d %s records", len(rows), key)
+                continue
+
+            for filtered in rows:
                 obj = model(**filtered)
                 session.add(obj)
-                print(f"- Added {key}: {filtered}")
+                logger.log(logging.INFO if verbose else logging.DEBUG, "Added %s: %s", key, filtered)
+
+        if commit:
+            session.commit()
+
+    def sync_document_records(self, session: Session, data: dict, verbose: bool = False, commit: bool = True) -> dict:
+        """
+        Incremental variant of insert_non_patient_entities for a registered document (data["document"]):
+        each section is diffed against the rows the document stored last time by natural key (json_merger's
+        SECTION_KEYS within the resolved visit), and only the delta is written. Records and visits that no
+        longer appear in the extraction are deleted. Returns {section: {"inserted", "updated", "unchanged", "deleted"}}.
+        """
+        document = data["document"]
+        summary = {}
+        for key, key_fields in SECTION_KEYS.items():
+            model = MODEL_MAP[key]
+            records = data.get(key) or []
+            if isinstance(records, dict):
+                records = [records]
+
+            rows_by_key, occurrences = {}, {}
+            for record in records:
+                row = complete_row(model, record)
+                natural_key = natural_key_hash(row, key_fields, scope=(row.get("visit_id"),))
+                # Records JSONMerger kept apart under the same key (listed twice in one chunk) get their own rows
+                occurrences[natural_key] = occurrences.get(natural_key, 0) + 1
+                if occurrences[natural_key] > 1:
+                    natural_key = natural_key_hash(row, key_fields, scope=(row.get("visit_id"), occurrences[natural_key] - 1))
+                rows_by_key[natural_key] = row
+            summary[key] = sync_document_rows(session, model, document["document_id"], rows_by_key)
+            logger.log(logging.INFO if verbose else logging.DEBUG, "Synced %s records: %s", key, summary[key])
 
-        session.commit()
+        # Visits go last: their stale child records are gone by now
+        result = session.execute(delete(Visit).where(and_(
+            Visit.document_id == document["document_id"], Visit.id.notin_(document.get("visit_ids") or [])
+        )))
+        summary["visit"] = {"deleted": result.rowcount}
 
+        if commit:
+            session.commit()
+        return summary
@@ -0,0 +1,146 @@
+# Re-asks the LLM for only the records that failed validation, using the chunk each record most likely came from
+
+from utils.json_validator import JSONValidator
+from utils.json_prompt_gen import JSONPromptGen
+from pydantic import BaseModel
+import json
+import re
+
+REPAIR_PROMPT_TEMPLATE = """
+            Some records extracted from a medical document failed schema validation. Correct ONLY the records listed below.
+
+            IMPORTANT INSTRUCTIONS:
+            1. Use only information explicitly present in the source text
+            2. Keep every field that is already correct; fix or fill the fields named in the errors
+            3. If the source text does not support a record, return null for it
+            4. Return valid JSON only, in the form {{"<section>": [{{"index": <index>, "record": {{...}} or null}}]}}
+
+            Expected record structure:
+            {json_prompt}
+
+            Failing records and validation errors:
+            {failures}
+
+            Patient ID: {patient_id}
+
+            Source text:
+            {context}
+            """
+
+_WORD = re.compile(r"[a-z0-9]{3,}")
+
+class SectionRepairer:
+    def __init__(self, Analyzer, schemas_with_flags: dict[type[BaseModel], bool], max_rounds: int = 1,
+                 prompt_format: str = "compact", prompt_cache_dir: str = None):
+        """
+        Analyzer: DocAnalyzer used to send the repair prompts.
+        max_rounds: bound on validate -> re-ask cycles; records still invalid afterwards are left as they are.
+        Only list sections are repaired (a single-object section such as patient has no record index).
+        """
+        self.Analyzer = Analyzer
+        self.schemas_with_flags = schemas_with_flags
+        self.max_rounds = max_rounds
+        self.prompt_format = prompt_format
+        self.Generator = JSONPromptGen(prompt_cache_dir)
+        self.Validator = JSONValidator()
+        self.section_schemas = {
+            schema.__name__.lower(): schema for schema, wrap_in_list in schemas_with_flags.items() if wrap_in_list
+        }
+
+    def find_failures(self, data: dict) -> dict:
+        """{section: [{"index": i, "errors": [...]}, ...]} for every record that does not validate"""
+        failures = self.Validator.validate_sections(self.section_schemas, data)
+        return {
+            section: [error for error in errors if error["index"] is not None]
+            for section, errors in failures.items()
+            if any(error["index"] is not None for error in errors)
+        }
+
+    def repair(self, data: dict, chunks, patient_id, failures: dict = None) -> tuple[dict, dict]:
+        """
+        Re-ask only the failing records (grouped by their best-matching source chunk) and merge the corrections
+        back into data. failures: result of an earlier validation pass over data, to avoid validating it twice.
+        Returns the repaired data and a report with request and token counts.
+        """
+        report = {"rounds": 0, "requests": 0, "prompt_tokens": 0, "repaired": 0, "dropped": 0, "unresolved": 0}
+        chunk_words = [set(_WORD.findall(chunk.page_content.lower())) for chunk in chunks]
+
+        if failures is None:
+            failures = self.find_failures(data)
+        else:
+            failures = {
+                section: [error for error in errors if error["index"] is not None]
+                for section, errors in failures.items()
+                if section in self.section_schemas and any(error["index"] is not None for error in errors)
+            }
+        while failures and chunk_words and report["rounds"] < self.max_rounds:
+            report["rounds"] += 1
+
+            # One request per source chunk, holding every failing record that chunk best explains
+            requests = {}
+            for section, errors in failures.items():
+                for error in errors:
+                    chunk_idx = self._best_chunk(data[section][error["index"]], chunk_words)
+                    requests.setdefault(chunk_idx, {}).setdefault(section, []).append(error)
+
+            dropped = {}
+            for chunk_idx, section_errors in requests.items():
+                prompt_text = self.format_repair_prompt(data, section_errors, chunks[chunk_idx].page_content, patient_id)
+                report["requests"] += 1
+                report["prompt_tokens"] += self.Analyzer.estimate_tokens(prompt_text)
+                try:
+                    corrections = json.loads(self.Analyzer.invoke_prompt(prompt_text, REPAIR_PROMPT_TEMPLATE))
+                except Exception as e:
+                    print(f"Error repairing records from chunk {chunk_idx + 1}: {e}")
+                    continue
+
+                for section, errors in section_errors.items():
+                    requested = {error["index"] for error in errors}
+                    for correction in corrections.get(section) or []:
+                        if not isinstance(correction, dict) or correction.get("index") not in requested:
+                            continue
+                        if isinstance(correction.get("record"), dict):
+                            data[section][correction["index"]] = correction["record"]
+                        elif "record" in correction and correction["record"] is None:
+                            dropped.setdefault(section, set()).add(correction["index"])
+
+            # Unsupported records are removed after all corrections are applied so indices stay valid
+            for section, indices in dropped.items():
+                data[section] = [record for idx, record in enumerate(data[section]) if idx not in indices]
+                report["dropped"] += len(indices)
+
+            remaining = self.find_failures(data)
+            report["repaired"] += max(0, self._count(failures) - self._count(remaining) - sum(len(i) for i in dropped.values()))
+            failures = remaining
+
+        report["unresolved"] = self._count(failures)
+        return data, report
+
+    def format_repair_prompt(self, data: dict, section_errors: dict, context: str, patient_id) -> str:
+        failures = {
+            section: [
+                {
+                    "index": error["index"],
+                    "record": data[section][error["index"]],
+                    "errors": [f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error["errors"]]
+                }
+                for error in errors
+            ]
+            for section, errors in section_errors.items()
+        }
+        json_prompt = self.Generator.get_prompt_text(self.schemas_with_flags, self.prompt_format, sections=section_errors.keys())
+        return REPAIR_PROMPT_TEMPLATE.format(
+            json_prompt=json_prompt,
+            failures=json.dumps(failures, default=str),
+            patient_id=patient_id,
+            context=context
+        )
+
+    def _best_chunk(self, record, chunk_words: list[set]) -> int:
+        """Index of the chunk sharing the most words with the record's values"""
+        values = " ".join(str(value) for value in record.values() if value is not None) if isinstance(record, dict) else str(record)
+        words = set(_WORD.findall(values.lower()))
+        return max(range(len(chunk_words)), key=lambda idx: len(words & chunk_words[idx]))
+
+    def _count(self, failures: dict) -> int:
+        return sum(len(errors) for errors in failures.values())
@@ -0,0 +1,65 @@
+# Picks the schema sections that are relevant to a chunk of document text, so only those schemas are sent with it
+
+import re
+
+# Sections sent with every chunk: the patient record and the visits every other record links to
+ALWAYS_SECTIONS = ("patient", "visit")
+
+# Cue words/abbreviations per section, matched case-insensitively on word boundaries
+SECTION_KEYWORDS = {
+    "visitnotes": [
+        "chief complaint", "cc", "hpi", "history of present illness", "review of systems", "ros",
+        "physical exam", "exam", "assessment", "plan", "progress note", "note", "subjective", "objective"
+    ],
+    "diagnosis": [
+        "diagnosis", "diagnoses", "dx", "impression", "problem list", "problems", "icd", "icd-10",
+        "assessment", "history of", "chronic", "rule out", "r/o"
+    ],
+    "symptom": [
+        "symptom", "symptoms", "complains", "complaint", "reports", "denies", "pain", "nausea", "vomiting",
+        "fever", "cough", "fatigue", "dizziness", "headache", "shortness of breath", "sob", "onset"
+    ],
+    "medication": [
+        "medication", "medications", "meds", "rx", "prescribed", "prescription", "mg", "mcg", "ml", "tablet",
+        "tab", "capsule", "dose", "daily", "bid", "tid", "qid", "prn", "qhs", "po", "sig", "refill"
+    ],
+    "vitalsigns": [
+        "vitals", "vital signs", "bp", "blood pressure", "pulse", "hr", "heart rate", "temp", "temperature",
+        "spo2", "o2 sat", "oxygen saturation", "rr", "respiratory rate", "weight", "height", "bmi", "mmhg"
+    ],
+    "labresult": [
+        "lab", "labs", "laboratory", "result", "results", "reference range", "ref range", "specimen", "panel",
+        "cbc", "cmp", "bmp", "wbc", "hgb", "hemoglobin", "glucose", "sodium", "potassium", "creatinine",
+        "a1c", "hba1c", "lipid", "ldl", "hdl", "tsh", "loinc", "abnormal", "collected"
+    ],
+    "imagingstudy": [
+        "imaging", "radiology", "radiologist", "x-ray", "xray", "radiograph", "ct", "mri", "ultrasound", "us",
+        "echocardiogram", "echo", "mammogram", "pet", "findings", "impression", "technique", "comparison"
+    ],
+    "proceduretreatment": [
+        "procedure", "procedures", "surgery", "surgical", "operative", "cpt", "therapy", "treatment",
+        "injection", "biopsy", "performed", "excision", "repair", "catheter", "anesthesia", "vaccine",
+        "immunization", "physical therapy"
+    ]
+}
+
+class SectionSelector:
+    def __init__(self, section_keywords: dict = None, always_sections=ALWAYS_SECTIONS):
+        """section_keywords: {section key: [cue words]}; defaults to SECTION_KEYWORDS"""
+        self.always_sections = tuple(always_sections)
+        self._patterns = {
+            section: re.compile(r"(?<!\w)(?:" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")(?!\w)", re.IGNORECASE)
+            for section, words in (section_keywords or SECTION_KEYWORDS).items()
+        }
+
+    def select(self, text: str) -> tuple:
+        """Section keys whose cue words appear in text, plus the always-sent sections"""
+        selected = list(self.always_sections)
+        for section, pattern in self._patterns.items():
+            if section not in selected and pattern.search(text):
+                selected.append(section)
+        return tuple(selected)
+
+    def count_cues(self, text: str) -> int:
+        """Cue word occurrences across all sections (how clinical a piece of text looks)"""
+        return sum(len(pattern.findall(text)) for pattern in self._patterns.values())
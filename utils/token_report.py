@@ -0,0 +1,78 @@
+# Compares the input tokens of each prompt mode (JSON vs compact schema, all vs selected sections, with/without chunk routing) on scraped documents
+
+from schemas.json_schemas import EXTRACTION_SCHEMAS
+from utils.json_prompt_gen import JSONPromptGen, PATIENT_ID_PLACEHOLDER
+from utils.section_selector import SectionSelector
+from tools.chunk_router import ChunkRouter
+import argparse
+import json
+
+# mode: (prompt_format, select_sections, route_chunks)
+PROMPT_MODES = {
+    "json":             ("json", False, False),
+    "compact":          ("compact", False, False),
+    "json_selected":    ("json", True, False),
+    "compact_selected": ("compact", True, False),
+    "json_routed":      ("json", True, True),
+    "compact_routed":   ("compact", True, True)
+}
+
+def build_token_report(Analyzer, documents: list[str], schemas_with_flags: dict = None, token_budget: int = None,
+                       count_tokens=None, prompt_cache_dir: str = None) -> dict:
+    """
+    Render the prompt of every request each mode would send for documents (scraped markdown, chunked and
+    grouped exactly like the pipeline) and total their tokens. count_tokens defaults to the analyzer's
+    ~4 chars/token estimate; pass e.g. Analyzer.get_llm().get_num_tokens for the model's own tokenizer.
+    """
+    schemas_with_flags = schemas_with_flags or EXTRACTION_SCHEMAS
+    count_tokens = count_tokens or Analyzer.estimate_tokens
+    Generator = JSONPromptGen(prompt_cache_dir)
+    Selector = SectionSelector()
+
+    Router = ChunkRouter(Selector)
+
+    groups, routed_groups = [], []
+    for text in documents:
+        groups.extend(Analyzer.group_chunks(Analyzer.chunk_text(text), token_budget))
+        # ChunkRouter cleans chunks in place, so the routed modes get their own copy
+        routed_groups.extend(Analyzer.group_chunks(Router.route(Analyzer.chunk_text(text)), token_budget))
+
+    report = {
+        "documents": len(documents),
+        "requests": len(groups),
+        "document_tokens": sum(count_tokens(Analyzer.group_context(group)) for group in groups),
+        "modes": {}
+    }
+    for mode, (prompt_format, select_sections, route_chunks) in PROMPT_MODES.items():
+        prompt_tokens = schema_tokens = 0
+        mode_groups = routed_groups if route_chunks else groups
+        for group in mode_groups:
+            sections = Selector.select(Analyzer.group_context(group)) if select_sections else None
+            json_prompt = Generator.get_prompt_text(schemas_with_flags, prompt_format, sections=sections)
+            schema_tokens += count_tokens(json_prompt)
+            prompt_tokens += count_tokens(Analyzer.format_prompt(group, PATIENT_ID_PLACEHOLDER, json_prompt))
+        report["modes"][mode] = {
+            "requests": len(mode_groups),
+            "prompt_tokens": prompt_tokens,
+            "schema_tokens": schema_tokens,
+            "avg_prompt_tokens": round(prompt_tokens / len(mode_groups), 1) if mode_groups else 0
+        }
+
+    baseline = report["modes"]["json"]["prompt_tokens"]
+    for stats in report["modes"].values():
+        stats["reduction_pct"] = round(100 * (1 - stats["prompt_tokens"] / baseline), 1) if baseline else 0.0
+    return report
+
+if __name__ == "__main__":
+    from tools.analyze_doc import DocAnalyzer
+
+    parser = argparse.ArgumentParser(description="Compare prompt tokens per prompt mode on scraped markdown files")
+    parser.add_argument("files", nargs="+", help="scraped .md files (e.g. scraped.md from a run_dir checkpoint)")
+    parser.add_argument("--token-budget", type=int, default=None, help="group chunks like map_reduce/async (default: one chunk per request)")
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            documents.append(f.read())
+    print(json.dumps(build_token_report(DocAnalyzer(None), documents, token_budget=args.token_budget), indent=2))
@@ -0,0 +1,146 @@
+# Runs the JSONFormatter + SQLSaver persistence sequence inside one transaction per document (or per group of documents)
+
+from utils.json_formatter import JSONFormatter
+from utils.save_to_sql import SQLSaver
+from utils.document_registry import DocumentRegistry
+from utils.metrics import metrics
+import threading
+
+class UnitOfWork:
+    def __init__(self, pipeline_config: dict = None, provider_cache=None):
+        """pipeline_config selects the bulk/per-row variants of each step (bulk_resolve, bulk_visits, bulk_insert)"""
+        self.pipeline_config = pipeline_config or {}
+        self.provider_cache = provider_cache
+        self.formatter = JSONFormatter()
+        self.saver = SQLSaver()
+
+    def resolve_ids(self, session, data: dict, commit: bool = True, pending_cache_updates: list = None) -> dict:
+        """
+        Preprocessing step to reconcile foreign keys (patient_id, provider_ids, department_ids, and visit_ids).
+        Documents carrying a registration (data["document"], see utils.document_registry) are registered and
+        their visits upserted against the previous ingestion instead of inserted.
+        """
+        with metrics.stage("resolve_ids"):
+            return self._resolve_ids(session, data, commit, pending_cache_updates)
+
+    def _resolve_ids(self, session, data: dict, commit: bool, pending_cache_updates: list) -> dict:
+        self.formatter.insert_patient_from_json(session, data, commit=commit)
+        document = data.get("document")
+        if document is not None:
+            document["document_id"] = DocumentRegistry.register(session, document)
+
+        if self.pipeline_config.get("bulk_resolve", False):
+            data = self.formatter.resolve_providers_and_departments_bulk(
+                session, data, cache=self.provider_cache, commit=commit, pending_cache_updates=pending_cache_updates
+            )
+        else:
+            data = self.formatter.resolve_providers_and_departments(session, data, commit=commit)
+
+        if document is not None:
+            return self.formatter.upsert_visits(session, data, document["document_id"], commit=commit)
+        if self.pipeline_config.get("bulk_visits", False):
+            return self.formatter.insert_visits_bulk(session, data, commit=commit)
+        return self.formatter.insert_visits_and_resolve_ids(session, data, commit=commit)
+
+    def save_records(self, session, data: dict, commit: bool = True) -> None:
+        with metrics.stage("save_records"):
+            if data.get("document") is not None:
+                self.saver.sync_document_records(
+                    session, data, verbose=self.pipeline_config.get("verbose_persistence", False), commit=False
+                )
+                DocumentRegistry.mark_ingested(session, data["document"])
+                if commit:
+                    session.commit()
+                return
+            self.saver.insert_non_patient_entities(
+                session, data,
+                bulk=self.pipeline_config.get("bulk_insert", False),
+                verbose=self.pipeline_config.get("verbose_persistence", False),
+                commit=commit
+            )
+
+    def persist(self, SessionLocal, data: dict) -> dict:
+        """Persist one document with a single commit; nothing is written if any step fails"""
+        errors = self.persist_many(SessionLocal, [data])
+        if errors[0] is not None:
+            raise errors[0]
+        return data
+
+    def persist_many(self, SessionLocal, documents: list[dict]) -> list:
+        """
+        Persist several documents in one transaction with one commit. Each document runs in its own
+        savepoint, so a failing document is rolled back on its own and reported in the returned list
+        (None for documents that were committed).
+        """
+        errors = []
+        pending_cache_updates = []
+        with SessionLocal() as session:
+            for data in documents:
+                document_updates = []
+                try:
+                    with session.begin_nested():
+                        self.resolve_ids(session, data, commit=False, pending_cache_updates=document_updates)
+                        self.save_records(session, data, commit=False)
+                    errors.append(None)
+                    pending_cache_updates.extend(document_updates)
+                except Exception as e:
+                    print(f"Error persisting document, rolled back to savepoint: {e}")
+                    errors.append(e)
+
+            try:
+                with metrics.stage("commit"):
+                    session.commit()
+            except Exception as e:
+                session.rollback()
+                return [error if error is not None else e for error in errors]
+
+        # Ids are only shared with other documents once they are committed
+        if self.provider_cache is not None:
+            for department_ids, provider_ids in pending_cache_updates:
+                self.provider_cache.put_departments(department_ids)
+                self.provider_cache.put_providers(provider_ids)
+        return errors
+
+class GroupCommitter:
+    def __init__(self, unit_of_work: UnitOfWork, SessionLocal, documents_per_commit: int = 10, max_wait_seconds: float = 2.0):
+        """
+        Collects documents from concurrent batch workers and persists them documents_per_commit at a time.
+        A worker whose group does not fill up within max_wait_seconds commits whatever is buffered.
+        """
+        self.unit_of_work = unit_of_work
+        self.SessionLocal = SessionLocal
+        self.documents_per_commit = documents_per_commit
+        self.max_wait_seconds = max_wait_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def submit(self, data: dict) -> dict:
+        """Blocks until the document is committed and raises its error if it was rolled back"""
+        entry = {"data": data, "done": threading.Event(), "error": None}
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.documents_per_commit
+
+        if full or not entry["done"].wait(self.max_wait_seconds):
+            self.flush()
+        entry["done"].wait()
+
+        if entry["error"] is not None:
+            raise entry["error"]
+        return data
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            if not entries:
+                return
+
+            try:
+                errors = self.unit_of_work.persist_many(self.SessionLocal, [entry["data"] for entry in entries])
+            except Exception as e:
+                errors = [e] * len(entries)
+            for entry, error in zip(entries, errors):
+                entry["error"] = error
+                entry["done"].set()
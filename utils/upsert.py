@@ -0,0 +1,104 @@
+# Natural-key diff and upsert of the rows one source document owns (incremental re-ingestion)
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import hashlib
+import json
+
+def content_hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def natural_key_hash(row: dict, key_fields: tuple, scope: tuple = ()) -> str:
+    """
+    Hash of the record's natural key within its scope (e.g. the resolved visit_id).
+    Records whose natural key fields are all empty are keyed by their whole content instead.
+    """
+    values = [row.get(field) for field in key_fields]
+    if all(value is None for value in values):
+        values = sorted((k, v) for k, v in row.items() if k != "created_date")
+    return content_hash([list(scope), values])
+
+def complete_row(model, row: dict) -> dict:
+    """
+    Every content column of model, so an update also clears values that disappeared from the new extraction;
+    missing values take the column's scalar default (e.g. is_active=True) as they would on a plain insert
+    """
+    completed = {}
+    for column in model.__table__.columns:
+        if column.name in ("id", "created_date", "document_id", "natural_key", "row_hash"):
+            continue
+        value = row.get(column.name)
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        completed[column.name] = value
+    return completed
+
+def row_hash(row: dict) -> str:
+    return content_hash({k: v for k, v in row.items() if k not in ("created_date", "natural_key", "row_hash")})
+
+def sync_document_rows(session: Session, model, document_id: int, rows_by_key: dict, delete_stale: bool = True) -> dict:
+    """
+    Diff rows_by_key ({natural_key: row}) against the rows the document already owns in model's table:
+    new and changed rows are upserted on (document_id, natural_key), unchanged rows are left alone and
+    (with delete_stale) rows whose natural key no longer appears are deleted.
+    Returns {"inserted", "updated", "unchanged", "deleted"} counts.
+    """
+    stored = {natural_key: (row_id, stored_hash) for row_id, natural_key, stored_hash in session.execute(
+        select(model.id, model.natural_key, model.row_hash).where(model.document_id == document_id)
+    )}
+
+    changed, counts = [], {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    for natural_key, row in rows_by_key.items():
+        row = dict(row, document_id=document_id, natural_key=natural_key, row_hash=row_hash(row))
+        if natural_key not in stored:
+            counts["inserted"] += 1
+        elif stored[natural_key][1] != row["row_hash"]:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        changed.append(row)
+
+    upsert(session, model, changed, stored={key: row_id for key, (row_id, _) in stored.items()})
+
+    if delete_stale:
+        stale_ids = [row_id for natural_key, (row_id, _) in stored.items() if natural_key not in rows_by_key]
+        if stale_ids:
+            session.execute(delete(model).where(model.id.in_(stale_ids)))
+        counts["deleted"] = len(stale_ids)
+    return counts
+
+def upsert(session: Session, model, rows: list[dict], stored: dict = None) -> None:
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite, PostgreSQL) keyed on the
+    (document_id, natural_key) unique index. Rows are grouped by column set so omitted columns keep their
+    defaults on insert. Other dialects update stored rows by primary key (stored: {natural_key: id}) and insert the rest.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    dialect = session.get_bind().dialect.name
+    for columns, group in groups.items():
+        update_columns = [column for column in columns if column not in ("id", "document_id", "natural_key", "created_date")]
+        if dialect == "mysql":
+            stmt = mysql_insert(model.__table__)
+            stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+        elif dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite_insert if dialect == "sqlite" else postgresql_insert)(model.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=["document_id", "natural_key"],
+                                              set_={column: stmt.excluded[column] for column in update_columns})
+        else:
+            stored = stored or {}
+            existing = [dict({column: row[column] for column in update_columns}, id=stored[row["natural_key"]])
+                        for row in group if row["natural_key"] in stored]
+            if existing:
+                session.execute(update(model), existing)
+            new_rows = [row for row in group if row["natural_key"] not in stored]
+            if new_rows:
+                session.execute(model.__table__.insert(), new_rows)
+            continue
+        session.execute(stmt, group)